@@ -31,160 +31,273 @@ The example models the following energy system:
 # imports
 ###############################################################################
 
-# Outputlib
-from oemof import outputlib
-
 # Default logger of oemof
 from oemof.tools import logger
 from oemof.tools import helpers
 
 
-# import oemof base classes to create energy system objects
+# oemof.solph, pyomo and matplotlib are imported by the functions that need
+# them, so importing this module (e.g. for the constants) stays fast
 import logging
 import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import oemof.solph as solph
 import values
-
-def optimise_storage_size(filename="HSNR.csv", solvername='cbc',
-                          debug=True, number_timesteps=8760, tee_switch=True):
-    logging.info('Initialize the energy system')
-    date_time_index = pd.date_range('1/1/2012', periods=number_timesteps,
-                                    freq='H')
+import cache
+import store
+import snapshot
+import validate
+from profiling import phase, RunReport
+
+# Fixed-profile sources of the model (label = column in HSNR.csv = name in
+# values.py)
+FIXED_SOURCES = ['biomass', 'brown_lig', 'coal_derived_gas', 'fossil_gas',
+                 'fossil_hardcoal', 'fossil_oil', 'geothermal',
+                 'hydro_pumped_storage', 'run_of_river',
+                 'hydro_water_reservoir', 'nuclear', 'solar', 'waste',
+                 'wind_offshore']
+
+# Columns of HSNR.csv referenced by the model
+DATA_COLUMNS = ['demand_el'] + FIXED_SOURCES
+# Running number of the rows (only read for the validation)
+TIMESTEP_COLUMN = 'timestep'
+
+# Model parameters with their defaults in values.py: the nominal values of
+# the fixed sources plus demand scaling, gas limit and cost parameters
+PARAMETERS = FIXED_SOURCES + ['demand_scale', 'gas_summed_max',
+                              'storage_capex', 'storage_lifetime',
+                              'storage_wacc', 'fixed_costs',
+                              'pp_gas_variable_costs',
+                              'storage_variable_costs']
+
+
+# Maximum hourly flow of the gas resource for a full year, conversion factors
+# of the gas power plant and of the storage output
+RGAS_NOMINAL_VALUE = 194397000
+PP_GAS_CONVERSION = 0.58
+STORAGE_OUTFLOW_CONVERSION = 0.8
+
+
+def get_parameters(parameters=None):
+    """Return all model parameters: the defaults from values.py updated by
+    the given dictionary."""
+    result = {name: getattr(values, name) for name in PARAMETERS}
+    if parameters:
+        unknown = set(parameters) - set(result)
+        if unknown:
+            raise ValueError('Unknown parameters: {0}'.format(
+                sorted(unknown)))
+        result.update(parameters)
+    return result
+
+
+def storage_ep_costs(parameters):
+    """Calculate ep_costs from capex to compare with old solph."""
+    capex = parameters['storage_capex']
+    lifetime = parameters['storage_lifetime']
+    wacc = parameters['storage_wacc']
+    if wacc == 0:
+        # limit of the annuity for wacc -> 0
+        return capex / lifetime
+    return capex * (wacc * (1 + wacc) ** lifetime) / ((1 + wacc) ** lifetime - 1)
+
+
+# Name of the thread option of the solvers
+SOLVER_THREAD_OPTIONS = {'cbc': 'threads', 'cplex': 'threads',
+                         'gurobi': 'Threads', 'appsi_highs': 'threads',
+                         'cplex_persistent': 'threads',
+                         'gurobi_persistent': 'Threads',
+                         'gurobi_direct': 'Threads'}
+
+# Name of the time limit option [s] of the solvers
+SOLVER_TIME_LIMIT_OPTIONS = {'cbc': 'sec', 'glpk': 'tmlim',
+                             'cplex': 'timelimit', 'gurobi': 'TimeLimit',
+                             'appsi_highs': 'time_limit',
+                             'cplex_persistent': 'timelimit',
+                             'gurobi_persistent': 'TimeLimit',
+                             'gurobi_direct': 'TimeLimit'}
+
+
+def solver_options(solvername, threads=None, time_limit=None):
+    """Return the command line options of the solver for the number of
+    threads (solvers without thread option run single-threaded anyway) and
+    the time limit in seconds."""
+    options = {}
+    if threads is not None and solvername in SOLVER_THREAD_OPTIONS:
+        options[SOLVER_THREAD_OPTIONS[solvername]] = threads
+    if time_limit is not None:
+        if solvername not in SOLVER_TIME_LIMIT_OPTIONS:
+            raise ValueError('No time limit option known for {0}.'.format(
+                solvername))
+        options[SOLVER_TIME_LIMIT_OPTIONS[solvername]] = time_limit
+    return options
+
+
+def is_direct_solver(solvername):
+    """True for solvers that get the model in memory from Pyomo (no lp
+    file), e.g. 'appsi_highs', 'gurobi_persistent' or 'gurobi_direct'."""
+    return (solvername.startswith('appsi_') or
+            solvername.endswith(('_persistent', '_direct')))
+
+
+def solve_model(om, energysystem, solvername='cbc', tee_switch=False,
+                cmdline_options=None, solve_kwargs=None):
+    """Solve the OperationalModel and store the results in the
+    EnergySystem.
+
+    Shell solvers (cbc, glpk, ...) go through om.solve (lp file hand-off),
+    direct solvers (see is_direct_solver) get the model in memory.
+    """
+    import pyomo.environ as po
+    from pyomo.opt import SolverFactory
+
+    solve_kwargs = dict(solve_kwargs or {}, tee=tee_switch)
+    if not is_direct_solver(solvername):
+        return om.solve(solver=solvername, solve_kwargs=solve_kwargs,
+                        cmdline_options=cmdline_options or {})
+
+    opt = SolverFactory(solvername)
+    for key, value in (cmdline_options or {}).items():
+        opt.options[key] = value
+    if hasattr(opt, 'set_instance'):
+        opt.set_instance(om)
+    solve_kwargs.pop('warmstart', None)
+    results = opt.solve(om, **solve_kwargs)
+
+    # store the results like solph's solve does
+    energysystem.results = om.results()
+    energysystem.results.objective = po.value(om.objective)
+    energysystem.results.solver = results
+    return results
+
+
+def load_data(filename="HSNR.csv", use_cache=True, dtype=np.float64,
+              fill_missing=0.0, columns=None):
+    """Read the columns of the time series file (relative to this directory)
+    the model uses (columns, default: DATA_COLUMNS) with one dtype (e.g.
+    np.float32 to halve the memory); with use_cache from the binary cache.
+
+    Missing values ('n/e') become fill_missing (no feed-in), or NaN if
+    fill_missing is None.
+    """
+    full_filename = os.path.join(os.path.dirname(__file__), filename)
+    columns = columns or DATA_COLUMNS
+    if use_cache:
+        return cache.load_columns(full_filename, columns, dtype=dtype,
+                                  fill_missing=fill_missing)
+    return cache.read_columns(full_filename, columns, dtype=dtype,
+                              fill_missing=fill_missing)
+
+
+def fixed_profiles(data, date_time_index, parameters):
+    """Return the fixed feed-in [MW] of all FIXED_SOURCES (profile times
+    nominal value) and the scaled demand ('demand') as DataFrame over
+    date_time_index."""
+    number_timesteps = len(date_time_index)
+    nominal_values = np.array([parameters[label] for label in FIXED_SOURCES],
+                              dtype=float)
+    supply = (data[FIXED_SOURCES].to_numpy(dtype=float)[:number_timesteps] *
+              nominal_values)
+    profiles = pd.DataFrame(supply, index=date_time_index,
+                            columns=FIXED_SOURCES)
+    profiles['demand'] = (data['demand_el'].to_numpy(dtype=float)
+                          [:number_timesteps] * parameters['demand_scale'])
+    return profiles
+
+
+def create_energysystem(data, date_time_index, parameters=None,
+                        presolve=False):
+    import oemof.solph as solph
+
+    parameters = get_parameters(parameters)
 
     energysystem = solph.EnergySystem(timeindex=date_time_index)
-
-    # Read data file
-    full_filename = os.path.join(os.path.dirname(__file__), filename)
-    data = pd.read_csv(full_filename, sep=",")
+    energysystem.parameters = parameters
 
     ##########################################################################
     ########################## Create oemof object ###########################
     ##########################################################################
     #Die Variablen z.B. values.lignite wurden in der Datei values.py ausgelagert
+    #(Überschreiben einzelner Werte über das Dictionary 'parameters')
     logging.info('Create oemof objects')
+    profiles = create_region(data, date_time_index, parameters,
+                             presolve=presolve)
+    if presolve:
+        energysystem.fixed_profiles = profiles
+
+    return energysystem
+
+
+def create_region(data, date_time_index, parameters, presolve=False,
+                  suffix=''):
+    """Create the buses and components of one region in the current
+    EnergySystem, all labels extended by suffix (e.g. '_DE'). Returns the
+    fixed profiles if presolve.
+
+    parameters: complete (see get_parameters).
+    """
+    import oemof.solph as solph
+
+    number_timesteps = len(date_time_index)
+    profiles = None
 
     # create thermal and electricity bus
-    bel = solph.Bus(label="electricity")
+    bel = solph.Bus(label="electricity" + suffix)
     #bth = solph.Bus(label="thermal")       
 
     # create gas bus
-    bgas = solph.Bus(label="natural_gas")
+    bgas = solph.Bus(label="natural_gas" + suffix)
 
     
     # create excess component for the electricity bus to allow overproduction
-    solph.Sink(label='excess_bel', inputs={bel: solph.Flow()})
+    solph.Sink(label='excess_bel' + suffix, inputs={bel: solph.Flow()})
 
     ##################################################################
     #####################     Sink Objects     #######################
     ##################################################################
-    
-    # create simple sink object for electrical demand
-    solph.Sink(label='demand', inputs={bel: solph.Flow(
-        actual_value=data['demand_el'], fixed=True, nominal_value=0.25)})
-
-    ##################################################################
-    ###################     Baseload Objects     #####################
-    ##################################################################
-    
-    
-    # create fixed source object for biomass
-    solph.Source(label='biomass', outputs={bel: solph.Flow(
-       actual_value=data['biomass'], nominal_value=values.biomass, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for brown coal/ lignite
-    solph.Source(label='brown_lig', outputs={bel: solph.Flow(
-       actual_value=data['brown_lig'], nominal_value=values.brown_lig, fixed=True,
-       fixed_costs=20)})
-
-
-    # create fixed source object for fossil-coal derived gas
-    solph.Source(label='coal_derived_gas', outputs={bel: solph.Flow(
-       actual_value=data['coal_derived_gas'], nominal_value=values.coal_derived_gas, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for fossil gas
-    solph.Source(label='fossil_gas', outputs={bel: solph.Flow(
-       actual_value=data['fossil_gas'], nominal_value=values.fossil_gas, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for fossil hardcoal
-    solph.Source(label='fossil_hardcoal', outputs={bel: solph.Flow(
-       actual_value=data['fossil_hardcoal'], nominal_value=values.fossil_hardcoal, fixed=True,
-       fixed_costs=20)})
-        
-    # create fixed source object for fossil oil
-    solph.Source(label='fossil_oil', outputs={bel: solph.Flow(
-       actual_value=data['fossil_oil'], nominal_value=values.fossil_oil, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for fossil oil shale
-    #solph.Source(label='fossil_oil_shale', outputs={bel: solph.Flow(
-    #   actual_value=data['fossil_oil_shale'], nominal_value=values.fossil_oil_shale, fixed=True,
-    #   fixed_costs=20)})
-
-    # create fixed source object for fossil peat
-    #solph.Source(label='fossil_peat', outputs={bel: solph.Flow(
-    #   actual_value=data['fossil_peat'], nominal_value=values.fossil_peat, fixed=True,
-    #   fixed_costs=20)})    
-
-    # create fixed source object for geothermal
-    solph.Source(label='geothermal', outputs={bel: solph.Flow(
-       actual_value=data['geothermal'], nominal_value=values.geothermal, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for hydro pumped storage
-    solph.Source(label='hydro_pumped_storage', outputs={bel: solph.Flow(
-       actual_value=data['hydro_pumped_storage'], nominal_value=values.hydro_pumped_storage, fixed=True,
-       fixed_costs=20)})
-
-    # create fixed source object for run-of-river
-    solph.Source(label='run_of_river', outputs={bel: solph.Flow(
-       actual_value=data['run_of_river'], nominal_value=values.run_of_river, fixed=True,
-       fixed_costs=20)})
-    
-    # create baseload object for hydro-water-reservoir
-    solph.Source(label='hydro_water_reservoir', outputs={bel: solph.Flow(
-        actual_value=data['hydro_water_reservoir'], nominal_value=values.hydro_water_reservoir, fixed=True,
-        fixed_costs=20)})
-
-    # create baseload object for marine
-    #solph.Source(label='marine', outputs={bel: solph.Flow(
-    #    actual_value=data['marine'], nominal_value=values.marine, fixed=True,
-    #    fixed_costs=20)})
-
-    # create baseload object for nuclear energy
-    solph.Source(label='nuclear', outputs={bel: solph.Flow(
-       actual_value=data['nuclear'], nominal_value=values.nuclear, fixed=True,
-       fixed_costs=20)})
-
-    # create commodity object for other
-    #solph.Source(label='other', outputs={bel: solph.Flow(
-    #    actual_value=data['other'], nominal_value=values.other, fixed=True,
-    #    fixed_costs=20)})
-
-    # create commodity object for other renewable
-    #solph.Source(label='other_renewable', outputs={bel: solph.Flow(
-    #    actual_value=data['other_renewable'], nominal_value=values.other_renewable, fixed=True,
-    #    fixed_costs=20)})
-
-    # create fixed source object for solar
-    solph.Source(label='solar', outputs={bel: solph.Flow(
-       actual_value=data['solar'], nominal_value=values.solar, fixed=True,
-       fixed_costs=20)})  
-
-    # create fixed source object for waste
-    solph.Source(label='waste', outputs={bel: solph.Flow(
-       actual_value=data['waste'], nominal_value=values.waste, fixed=True,
-       fixed_costs=20)})
 
-    
-    # create fixed source object for wind offshore
-    solph.Source(label='wind_offshore', outputs={bel: solph.Flow(
-        actual_value=data['wind_offshore'], nominal_value=values.wind_offshore, fixed=True,
-        fixed_costs=20)})
+    if presolve:
+        # Presolve: alle festen Profile (fixed=True) werden vorab mit ihren
+        # Nennwerten aus values.py zu einer Residuallast zusammengefasst.
+        # Positive Werte werden als eine feste Last, negative als eine feste
+        # Einspeisung modelliert; die Einzelprofile werden für
+        # get_result_dict am EnergySystem gespeichert.
+        profiles = fixed_profiles(data, date_time_index, parameters)
+        residual = (profiles['demand'] -
+                    profiles[FIXED_SOURCES].sum(axis=1)).to_numpy()
+
+        # create one fixed sink object for the residual demand
+        solph.Sink(label='residual_demand' + suffix, inputs={bel: solph.Flow(
+            actual_value=np.maximum(residual, 0), fixed=True,
+            nominal_value=1)})
+
+        # create one fixed source object for the residual surplus (carries
+        # the fixed costs of all aggregated sources)
+        solph.Source(label='residual_supply' + suffix,
+                     outputs={bel: solph.Flow(
+            actual_value=np.maximum(-residual, 0), fixed=True,
+            nominal_value=1,
+            fixed_costs=parameters['fixed_costs'] * sum(
+                parameters[label] for label in FIXED_SOURCES))})
+    else:
+        # create simple sink object for electrical demand
+        solph.Sink(label='demand' + suffix, inputs={bel: solph.Flow(
+            actual_value=data['demand_el'], fixed=True,
+            nominal_value=parameters['demand_scale'])})
+
+        ##############################################################
+        #################     Baseload Objects     ###################
+        ##############################################################
+
+        # create fixed source objects for biomass, brown coal/ lignite,
+        # fossil gas, nuclear, solar, wind offshore, ... (see FIXED_SOURCES;
+        # fossil_oil_shale, fossil_peat, marine, other and other_renewable
+        # are not modelled)
+        for label in FIXED_SOURCES:
+            solph.Source(label=label + suffix, outputs={bel: solph.Flow(
+                actual_value=data[label],
+                nominal_value=parameters[label], fixed=True,
+                fixed_costs=parameters['fixed_costs'])})
 
 
     ##################################################################
@@ -192,8 +305,9 @@ def optimise_storage_size(filename="HSNR.csv", solvername='cbc',
     ##################################################################
 
     # create commodity object for gas resource (summed_max für Begrenzung der Gasresource[kWh])
-    solph.Source(label='rgas', outputs={bgas: solph.Flow(
-        nominal_value=194397000 * number_timesteps / 8760, summed_max=5.8)})
+    solph.Source(label='rgas' + suffix, outputs={bgas: solph.Flow(
+        nominal_value=RGAS_NOMINAL_VALUE * number_timesteps / 8760,
+        summed_max=parameters['gas_summed_max'])})
 
     ##################################################################
     ###############     Transforming Objects     #####################
@@ -201,219 +315,311 @@ def optimise_storage_size(filename="HSNR.csv", solvername='cbc',
 
     # create simple transformer object for gas powerplant
     solph.LinearTransformer(
-        label="pp_gas",
+        label="pp_gas" + suffix,
         inputs={bgas: solph.Flow()},
-        outputs={bel: solph.Flow(nominal_value=10e10, variable_costs=30)},
-        conversion_factors={bel: 0.58})
+        outputs={bel: solph.Flow(
+            nominal_value=10e10,
+            variable_costs=parameters['pp_gas_variable_costs'])},
+        conversion_factors={bel: PP_GAS_CONVERSION})
 
     # Calculate ep_costs from capex to compare with old solph
-    capex = 1000
-    lifetime = 20
-    wacc = 0.05
-    epc = capex * (wacc * (1 + wacc) ** lifetime) / ((1 + wacc) ** lifetime - 1)
+    epc = storage_ep_costs(parameters)
 
     # create storage transformer object for storage
     # zu hohe variable Kosten des Speichers bewirken eine Favorisierung hin zu fossilen Brennstoffen) 
     solph.Storage(
-       label='storage',
-        inputs={bel: solph.Flow(variable_costs=10e2)},
-        outputs={bel: solph.Flow(variable_costs=10e2)},
+       label='storage' + suffix,
+        inputs={bel: solph.Flow(
+            variable_costs=parameters['storage_variable_costs'])},
+        outputs={bel: solph.Flow(
+            variable_costs=parameters['storage_variable_costs'])},
         capacity_loss=0.00, initial_capacity=0,
         nominal_input_capacity_ratio=1/6,
         nominal_output_capacity_ratio=1/6,
-        inflow_conversion_factor=1, outflow_conversion_factor=0.8,
+        inflow_conversion_factor=1,
+        outflow_conversion_factor=STORAGE_OUTFLOW_CONVERSION,
         fixed_costs=35,
         investment=solph.Investment(ep_costs=epc),
     )
 
+    return profiles
+
+
+def optimise_storage_size(filename="HSNR.csv", solvername='cbc',
+                          debug=False, number_timesteps=8760, tee_switch=True,
+                          use_cache=True, presolve=False, parameters=None,
+                          cmdline_options=None, report=None,
+                          validate_input=True, duals=False, data=None,
+                          dtype=np.float64):
+    import oemof.solph as solph
+
+    logging.info('Initialize the energy system')
+    date_time_index = pd.date_range('1/1/2012', periods=number_timesteps,
+                                    freq='H')
+
+    # Read data file (only the referenced columns, from the binary cache)
+    # unless the time series are given as DataFrame (data)
+    if data is None:
+        with phase(report, 'load_data'):
+            data = load_data(filename, use_cache=use_cache, dtype=dtype,
+                             fill_missing=None,
+                             columns=[TIMESTEP_COLUMN] + DATA_COLUMNS
+                             if validate_input else None)
+
+    # fail before building and solving the model
+    if validate_input:
+        with phase(report, 'validate'):
+            validate.validate(data, number_timesteps, parameters)
+    data = cache.fill_frame(data[DATA_COLUMNS], 0.0)
+
+    with phase(report, 'create_objects'):
+        energysystem = create_energysystem(data, date_time_index,
+                                           parameters=parameters,
+                                           presolve=presolve)
+
     ##########################################################################
     # Optimise the energy system and plot the results
     ##########################################################################
 
     logging.info('Optimise the energy system')
 
-    om = solph.OperationalModel(energysystem)
+    with phase(report, 'build_model'):
+        om = solph.OperationalModel(energysystem)
+    # duals and reduced costs for get_result_dict(duals=True)
+    if duals:
+        enable_duals(om)
+        energysystem.om = om
+    if report is not None:
+        report.model_size(om)
 
+    # lp file dump only as diagnostic option
     if debug:
         filename = os.path.join(
             helpers.extend_basic_path('lp_files'), 'HSNR.lp')
         logging.info('Store lp-file in {0}.'.format(filename))
-        om.write(filename, io_options={'symbolic_solver_labels': True})
+        with phase(report, 'write_lp'):
+            om.write(filename, io_options={'symbolic_solver_labels': True})
 
     logging.info('Solve the optimization problem')
-    om.solve(solver=solvername, solve_kwargs={'tee': tee_switch})
+    with phase(report, 'solve'):
+        solve_model(om, energysystem, solvername=solvername,
+                    tee_switch=tee_switch, cmdline_options=cmdline_options)
 
     return energysystem
 
 
-def get_result_dict(energysystem):
+def bus_flows(energysystem, bus_label='electricity'):
+    """Return all flows into ('to_bus') and out of ('from_bus') a bus as one
+    wide DataFrame with columns (type, label) over the time index.
+
+    For presolved systems the aggregated residual flows are replaced by the
+    stored profiles of the fixed sources and the demand.
+    """
+    bus = energysystem.groups[bus_label]
+    results = energysystem.results
+    keys, flows = [], []
+    for (source, target) in energysystem.flows():
+        if target is bus:
+            keys.append(('to_bus', source.label))
+        elif source is bus:
+            keys.append(('from_bus', target.label))
+        else:
+            continue
+        flows.append(results[source][target])
+
+    values = np.array(flows, dtype=float).T
+    frame = pd.DataFrame(values, index=energysystem.timeindex[:len(values)],
+                         columns=pd.MultiIndex.from_tuples(keys))
+
+    profiles = getattr(energysystem, 'fixed_profiles', None)
+    if profiles is not None and bus_label == 'electricity':
+        frame = expand_residual_flows(frame, profiles)
+    return frame
+
+
+def expand_residual_flows(frame, profiles):
+    """Replace the aggregated residual flows of a presolved system (see
+    bus_flows) by the profiles of the fixed sources and the demand."""
+    frame = frame.drop(columns=[('from_bus', 'residual_demand'),
+                                ('to_bus', 'residual_supply')],
+                       errors='ignore')
+    for label in FIXED_SOURCES:
+        frame[('to_bus', label)] = profiles[label].to_numpy()
+    frame[('from_bus', 'demand')] = profiles['demand'].to_numpy()
+    return frame
+
+
+# Divisor of the peak flow for the installed capacity (*_inst)
+INST_FACTORS = {'solar': 0.76474}
+
+
+def result_dict(flows, storage_cap, objective):
+    """Compute all result values from the flows of the electricity bus
+    (see bus_flows) in one reduction per direction."""
+    to_bus = flows['to_bus']
+    from_bus = flows['from_bus']
+    to_sum = dict(zip(to_bus.columns, to_bus.to_numpy().sum(axis=0)))
+    to_max = dict(zip(to_bus.columns, to_bus.to_numpy().max(axis=0)))
+    from_sum = dict(zip(from_bus.columns, from_bus.to_numpy().sum(axis=0)))
+    from_max = dict(zip(from_bus.columns, from_bus.to_numpy().max(axis=0)))
+
+    result = {}
+    for label in ['pp_gas'] + FIXED_SOURCES:
+        result[label + '_sum'] = to_sum[label]
+        result[label + '_inst'] = to_max[label] / INST_FACTORS.get(label, 1)
+        # full load hours of the installed capacity
+        result[label + '_flh'] = (
+            result[label + '_sum'] / result[label + '_inst']
+            if to_max[label] > 0 else 0.0)
+    result['demand_sum'] = from_sum['demand']
+    result['demand_max'] = from_max['demand']
+    result['excess_sum'] = from_sum.get('excess_bel', 0.0)
+    result['storage_discharge_sum'] = to_sum.get('storage', 0.0)
+    result['storage_charge_sum'] = from_sum.get('storage', 0.0)
+    result['storage_cycles'] = (result['storage_discharge_sum'] / storage_cap
+                                if storage_cap else 0.0)
+    result['storage_cap'] = storage_cap
+    result['objective'] = objective
+    return result
+
+
+def get_result_dict(energysystem, duals=False):
+    """Result values of a solved EnergySystem or of a snapshot.Snapshot.
+
+    With duals (system solved with optimise_storage_size(duals=True)) the
+    shadow prices, sensitivities and market values of dual_dict are added.
+    """
     logging.info('Check the results')
+    if isinstance(energysystem, snapshot.Snapshot):
+        if duals:
+            raise ValueError('Snapshots do not contain duals.')
+        return result_dict(energysystem.bus_flows(),
+                           energysystem.storage_cap, energysystem.objective)
     storage = energysystem.groups['storage']
-    myresults = outputlib.DataFramePlot(energy_system=energysystem)
-
-    dafr='2012-01-01 00:00:00'
-    dato='2012-12-31 23:00:00'
-
-    pp_gas = myresults.slice_by(obj_label='pp_gas', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    biomass = myresults.slice_by(obj_label='biomass', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-    
-    brown_lig = myresults.slice_by(obj_label='brown_lig', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    coal_derived_gas = myresults.slice_by(obj_label='coal_derived_gas', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    fossil_gas = myresults.slice_by(obj_label='fossil_gas', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    fossil_hardcoal = myresults.slice_by(obj_label='fossil_hardcoal', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    fossil_oil = myresults.slice_by(obj_label='fossil_oil', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    #fossil_oil_shale = myresults.slice_by(obj_label='fossil_oil_shale', type='to_bus',
-    #                            date_from=dafr,
-    #                            date_to=dato)
-
-    #fossil_peat = myresults.slice_by(obj_label='fossil_peat', type='to_bus',
-    #                            date_from=dafr,
-    #                            date_to=dato)    
-
-    geothermal = myresults.slice_by(obj_label='geothermal', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    hydro_pumped_storage = myresults.slice_by(obj_label='hydro_pumped_storage', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    run_of_river = myresults.slice_by(obj_label='run_of_river', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    hydro_water_reservoir = myresults.slice_by(obj_label='hydro_water_reservoir', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    #marine = myresults.slice_by(obj_label='marine', type='to_bus',
-    #                            date_from=dafr,
-    #                            date_to=dato)
-    
-    nuclear = myresults.slice_by(obj_label='nuclear', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    #other = myresults.slice_by(obj_label='other', type='to_bus',
-    #                            date_from=dafr,
-    #                            date_to=dato)
-
-    #other_renewable = myresults.slice_by(obj_label='other_renewable', type='to_bus',
-    #                            date_from=dafr,
-    #                            date_to=dato)
-
-    solar = myresults.slice_by(obj_label='solar', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    waste = myresults.slice_by(obj_label='waste', type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-     
-    wind_offshore = myresults.slice_by(obj_label='wind_offshore',type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-    demand = myresults.slice_by(obj_label='demand',type='to_bus',
-                                date_from=dafr,
-                                date_to=dato)
-
-
-    return {'pp_gas_sum': pp_gas.sum(),
-            'pp_gas_inst':pp_gas.max()/1,
-            'biomass_sum': biomass.sum(),
-            'biomass_inst': biomass.max()/1,
-            'brown_lig_sum': brown_lig.sum(),
-            'brown_lig_inst': brown_lig.max()/1,
-            'coal_derived_gas_sum': coal_derived_gas.sum(),
-            'coal_derived_gas_inst': coal_derived_gas.max()/1,
-            'fossil_gas_sum': fossil_gas.sum(),
-            'fossil_gas_inst': fossil_gas.max()/1,
-            'fossil_hardcoal_sum':fossil_hardcoal.sum(),
-            'fossil_hardcoal_inst':fossil_hardcoal.max()/1,
-            'fossil_oil_sum':fossil_oil.sum(),
-            'fossil_oil_inst':fossil_oil.max()/1,
-            #'fossil_oil_shale_sum':fossil_oil_shale.sum(),
-            #'fossil_oil_shale_inst':fossil_oil_shale.max()/1,
-            #'fossil_peat_sum':fossil_peat.sum(),
-            #'fossil_peat_inst':fossil_peat.max()/1,
-            'geothermal_sum':geothermal.sum(),
-            'geothermal_inst':geothermal.max()/1,
-            'hydro_pumped_storage_sum':hydro_pumped_storage.sum(),
-            'hydro_pumped_storage_inst':hydro_pumped_storage.max()/1,
-            'run_of_river_sum':run_of_river.sum(),
-            'run_of_river_inst':run_of_river.max()/1,
-            'hydro_water_reservoir_sum':hydro_water_reservoir.sum(),
-            'hydro_water_reservoir_inst':hydro_water_reservoir.max()/1,
-            #'marine_sum':marine.sum(),
-            #'marine_inst':marine.max()/1,
-            'nuclear_sum': nuclear.sum(),
-            'nuclear_inst': nuclear.max()/1,
-            #'other_sum':other.sum(),
-            #'other_inst':other.max()/1,
-            #'other_renewable_sum':other_renewable.sum(),
-            #'other_renewable_inst':other_reneweable.max()/1,
-            'solar_sum': solar.sum(),
-            'solar_inst': solar.max()/0.76474,
-            'waste_sum': waste.sum(),
-            'waste_inst': waste.max()/1,
-            'wind_offshore_sum':wind_offshore.sum(),
-            'wind_offshore_inst':wind_offshore.max()/1,
-            'demand_sum': demand.sum(),
-            'demand_max': demand.max(),
-            'storage_cap': energysystem.results[storage][storage].invest,
-            'objective': energysystem.results.objective
-            }
+    flows = bus_flows(energysystem)
+    result = result_dict(flows,
+                         energysystem.results[storage][storage].invest,
+                         energysystem.results.objective)
+    if duals:
+        result.update(dual_dict(energysystem, flows))
+    return result
+
+
+def enable_duals(om):
+    """Import duals and reduced costs from the solver (before solving)."""
+    import pyomo.environ as po
+    om.dual = po.Suffix(direction=po.Suffix.IMPORT)
+    om.rc = po.Suffix(direction=po.Suffix.IMPORT)
+
+
+def prices(energysystem, bus_label='electricity'):
+    """Hourly marginal price of the bus [cost unit/MWh]: dual of the bus
+    balance (cost of one more MWh of demand in that hour)."""
+    om = energysystem.om
+    bus = energysystem.groups[bus_label]
+    return pd.Series([om.dual[om.Bus.balance[bus, t]] for t in om.TIMESTEPS],
+                     index=energysystem.timeindex[:len(om.TIMESTEPS)],
+                     name=bus_label)
+
+
+def dual_dict(energysystem, flows=None):
+    """Shadow prices and sensitivities of one solve (see enable_duals).
+
+    price_*: statistics of the hourly electricity price, gas_limit_dual:
+    cost reduction per additional MWh of gas (summed_max), storage_cap_dual:
+    value of one more MWh of storage capacity over the year,
+    storage_invest_rc: reduced cost of the storage investment, d_objective_*:
+    first order change of the objective per unit of a parameter,
+    market_value_*: price weighted by the feed-in of a source,
+    value_factor_*: market value / mean price.
+    """
+    om = energysystem.om
+    groups = energysystem.groups
+    storage = groups['storage']
+    rgas, bgas = groups['rgas'], groups['natural_gas']
+    if flows is None:
+        flows = bus_flows(energysystem)
+    price = prices(energysystem).to_numpy()
+
+    result = {'price_mean': price.mean(),
+              'price_max': price.max(),
+              'price_min': price.min()}
+
+    # '<=' constraints of a minimisation have non-positive duals
+    gas_dual = -om.dual[om.Flow.summed_max[rgas, bgas]]
+    gas_nominal_value = om.flows[rgas, bgas].nominal_value
+    result['gas_limit_dual'] = gas_dual
+    result['storage_cap_dual'] = -sum(
+        om.dual[om.InvestmentStorage.max_capacity[storage, t]]
+        for t in om.TIMESTEPS)
+    result['storage_invest_rc'] = om.rc[om.InvestmentStorage.invest[storage]]
+
+    storage_cap = energysystem.results[storage][storage].invest
+    parameters = energysystem.parameters
+    result['d_objective_d_gas_summed_max'] = -gas_dual * gas_nominal_value
+    result['d_objective_d_storage_capex'] = (
+        storage_cap * storage_ep_costs(parameters) /
+        parameters['storage_capex'])
+    result['d_objective_d_demand_scale'] = (
+        price.dot(flows[('from_bus', 'demand')].to_numpy()) /
+        parameters['demand_scale'])
+
+    to_bus = flows['to_bus']
+    supply = to_bus.to_numpy()
+    supply_sum = supply.sum(axis=0)
+    market_values = price.dot(supply) / np.where(supply_sum > 0, supply_sum,
+                                                 np.nan)
+    for label, value in zip(to_bus.columns, market_values):
+        if label in ['pp_gas', 'storage'] + FIXED_SOURCES:
+            result['market_value_' + label] = value
+            result['value_factor_' + label] = value / result['price_mean']
+    return result
+
+
+# Colours of the flows in the plots
+COLORS = {'storage': '#42c77a',
+          'brown_lig':'#8B4513',
+          'coal_derived_gas':'#D2B48C',
+          'fossil_gas':'#CD661D',
+          'fossil_hardcoal':'#030303',
+          'fossil_oil':'#8B7355',
+          #'fossil_oil_shale':'#636f6b',
+          #'fossil_peat':'#636f6b',
+          'geothermal': '#ff0000',
+          #'marine': '#4169E1',
+          'nuclear': '#ff4040',
+          #'other':'#32CD32',
+          #'other_renewable':'#32CD32',
+          'solar':'#ffde32',
+          'waste':'#458B74',
+          'wind_offshore': '#5b5bae',
+          'hydro_pumped_storage':'#00008B',
+          'biomass': '#6B8E23',
+          'run_of_river':'#00CED1',
+          'hydro_water_reservoir': '#20B2AA',
+          'pp_gas': '#636f6b',
+          'demand': '#ce4aff',
+          'excess_bel':'#555555',
+          'residual_demand': '#ce4aff',
+          'residual_supply': '#8c8c8c',
+          }
+
+# Order of the stacked inputs (bars) and of the outputs (lines) in io_plot
+BAR_ORDER = ['nuclear','coal_derived_gas','fossil_gas','biomass','run_of_river','brown_lig',
+             'fossil_hardcoal','fossil_oil','fossil_oil_shale','fossil_peat','geothermal',
+             'hydro_pumped_storage','marine','solar','hydro_water_reservoir',
+             'waste','wind_offshore','other','other_renewable','pp_gas']
+LINE_ORDER = ['demand', 'storage', 'excess_bel']
 
 
 def create_plots(energysystem):
+    # only needed for the interactive plots
+    import matplotlib.pyplot as plt
+    from oemof import outputlib
 
     logging.info('Plot the results')
 
-    cdict = {'storage': '#42c77a',
-             'brown_lig':'#8B4513',
-             'coal_derived_gas':'#D2B48C',
-             'fossil_gas':'#CD661D',
-             'fossil_hardcoal':'#030303',
-             'fossil_oil':'#8B7355',
-             #'fossil_oil_shale':'#636f6b',
-             #'fossil_peat':'#636f6b',
-             'geothermal': '#ff0000',
-             #'marine': '#4169E1',
-             'nuclear': '#ff4040',
-             #'other':'#32CD32',
-             #'other_renewable':'#32CD32',
-             'solar':'#ffde32',
-             'waste':'#458B74',
-             'wind_offshore': '#5b5bae',
-             'hydro_pumped_storage':'#00008B',
-             'biomass': '#6B8E23',
-             'run_of_river':'#00CED1',
-             'hydro_water_reservoir': '#20B2AA',
-             'pp_gas': '#636f6b',
-             'demand': '#ce4aff',
-             'excess_bel':'#555555',
-             }
+    cdict = COLORS
 
     # Plotting the input flows of the electricity bus for January
     myplot = outputlib.DataFramePlot(energy_system=energysystem)
@@ -446,11 +652,8 @@ def create_plots(energysystem):
 
     handles, labels = myplot.io_plot(
         bus_label='electricity', cdict=cdict,
-        barorder=['nuclear','coal_derived_gas','fossil_gas','biomass','run_of_river','brown_lig',
-                  'fossil_hardcoal','fossil_oil','fossil_oil_shale','fossil_peat','geothermal',
-                  'hydro_pumped_storage','marine','solar','hydro_water_reservoir',
-                  'waste','wind_offshore','other','other_renewable','pp_gas'],
-        lineorder=['demand', 'storage', 'excess_bel'],
+        barorder=BAR_ORDER,
+        lineorder=LINE_ORDER,
         line_kwa={'linewidth': 4},
         ax=fig.add_subplot(1, 1, 1),
         date_from="2012-06-01 00:00:00",
@@ -467,12 +670,46 @@ def create_plots(energysystem):
 
 def run_HSNR():
     logger.define_logging()
-    esys = optimise_storage_size()
-     #esys.dump()
-     #esys.restore()
     import pprint as pp
-    pp.pprint(get_result_dict(esys))
-    create_plots(esys)
+
+    # bereits gelöste Szenarien werden aus dem Ergebnisspeicher geladen
+    result_store = store.ResultStore()
+    key, run, parameters = store.describe_run()
+    if key in result_store:
+        import render
+
+        logging.info('Load results of {0} from {1}.'.format(
+            key, result_store.path))
+        pp.pprint(result_store.get(key))
+        # Plots aus dem Snapshot bzw. den gespeicherten Flüssen
+        source = os.path.join(helpers.extend_basic_path('snapshots'), key)
+        if not os.path.isdir(source):
+            source = key
+        filenames = render.render_source(
+            source, helpers.extend_basic_path('figures'),
+            store_path=result_store.path)
+        logging.info('Plots stored in {0}.'.format(', '.join(filenames)))
+        return
+
+    report = RunReport(nonzeros=True, solvername='cbc',
+                       number_timesteps=8760)
+    esys = optimise_storage_size(report=report)
+    # kompakter Snapshot statt esys.dump() / esys.restore()
+    with phase(report, 'snapshot'):
+        snapshot.save(esys, os.path.join(
+            helpers.extend_basic_path('snapshots'), key))
+    pp.pprint(store.store_energysystem(result_store, key, run, parameters,
+                                       esys, report=report))
+
+    with phase(report, 'create_plots'):
+        create_plots(esys)
+
+    # Laufzeit, CPU-Zeit, Speicher und Modellgröße je Phase als JSON
+    filename = os.path.join(
+        helpers.extend_basic_path('reports'),
+        'HSNR_{0}.json'.format(report.started.replace(':', '-')))
+    logging.info('Store run report in {0}.'.format(filename))
+    report.write(filename)
 
 
 if __name__ == "__main__":
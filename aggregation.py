@@ -0,0 +1,288 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Time series aggregation to representative periods for fast screening runs of
+optimise_storage_size.
+
+The year is cut into periods (days: 24, weeks: 168 time steps), the periods
+are clustered with k-medoids over the normalized demand and fixed generation
+profiles and the model is solved for the k medoid periods only:
+
+ * variable costs are weighted with the number of periods a medoid
+   represents and the gas limit (summed_max) is applied to the weighted sum,
+ * the storage state of charge is linked across the original sequence of
+   periods (intra-period state of charge of the representative period plus
+   an inter-period state of charge per original period, Kotzur et al. 2018),
+   so the storage investment stays meaningful.
+
+error_report() compares the aggregated solves against the full-resolution
+solve to pick k.
+
+Usage:
+
+    energysystem = optimise_representative(k=12, period=24)
+    print(error_report([4, 8, 16, 32]))
+
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+import oemof.solph as solph
+
+import HSNR
+
+
+class Aggregation(object):
+    """Result of aggregate(): the representative time series and the
+    mapping of the original periods onto them.
+
+    data: k * period rows of the model columns (medoids in chronological
+    order), weights: weight of each representative time step, order: medoid
+    number of each original period, medoids: original period number of
+    each medoid, profile_error: RMSE of the normalized profiles.
+    """
+
+    def __init__(self, data, weights, order, medoids, period, profile_error):
+        self.data = data
+        self.weights = weights
+        self.order = order
+        self.medoids = medoids
+        self.period = period
+        self.profile_error = profile_error
+
+
+def k_medoids(features, k, max_iter=100):
+    """Cluster the rows of features into k clusters (greedy build and
+    alternating medoid updates). Returns medoid row numbers and labels.
+    Identical rows are never two medoids, so k must not exceed the number
+    of distinct rows."""
+    squared = (features ** 2).sum(axis=1)
+    distance = np.sqrt(np.maximum(
+        squared[:, None] + squared[None, :] - 2 * features.dot(features.T),
+        0))
+
+    medoids = [int(np.argmin(distance.sum(axis=1)))]
+    for _ in range(1, k):
+        nearest = distance[:, medoids].min(axis=1)
+        gain = np.maximum(nearest[:, None] - distance, 0).sum(axis=0)
+        gain[medoids] = -1
+        if gain.max() <= 0:
+            # only duplicates of the medoids are left
+            raise ValueError('k={0} exceeds the {1} distinct periods.'.format(
+                k, len(np.unique(features, axis=0))))
+        medoids.append(int(np.argmax(gain)))
+    medoids = np.array(medoids)
+
+    for _ in range(max_iter):
+        labels = np.argmin(distance[:, medoids], axis=1)
+        updated = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            if not len(members):
+                continue
+            within = distance[np.ix_(members, members)].sum(axis=1)
+            updated[cluster] = members[np.argmin(within)]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids, np.argmin(distance[:, medoids], axis=1)
+
+
+def aggregate(data, k, period=24, number_timesteps=8760, parameters=None):
+    """Cluster the periods of the model input into k representative periods.
+
+    The features are the demand and the fixed feed-in (profile times nominal
+    value), each normalized by its maximum. Incomplete periods at the end
+    are dropped.
+    """
+    parameters = HSNR.get_parameters(parameters)
+    n_periods = number_timesteps // period
+    if not 0 < k <= n_periods:
+        raise ValueError('k must be between 1 and {0}.'.format(n_periods))
+
+    index = pd.RangeIndex(n_periods * period)
+    profiles = HSNR.fixed_profiles(data, index, parameters).to_numpy()
+    scale = np.abs(profiles).max(axis=0)
+    normalized = profiles / np.where(scale > 0, scale, 1)
+    features = normalized.reshape(n_periods, period * profiles.shape[1])
+
+    medoids, labels = k_medoids(features, k)
+    # representative periods in chronological order
+    chronological = np.argsort(medoids)
+    medoids = medoids[chronological]
+    order = np.argsort(chronological)[labels]
+
+    rows = (medoids[:, None] * period + np.arange(period)).ravel()
+    representative = data[HSNR.DATA_COLUMNS].iloc[rows].reset_index(drop=True)
+    weights = np.repeat(np.bincount(order, minlength=k), period).astype(float)
+    profile_error = float(np.sqrt(
+        ((features - features[medoids][order]) ** 2).mean()))
+    return Aggregation(representative, weights, order, medoids, period,
+                       profile_error)
+
+
+def weight_variable_costs(energysystem, weights):
+    """Multiply the variable costs of all flows with the time step weights."""
+    for flow in energysystem.flows().values():
+        if flow.variable_costs[0] is None:
+            continue
+        flow.variable_costs = [flow.variable_costs[t] * w
+                               for t, w in enumerate(weights)]
+
+
+def weight_gas_limit(om, energysystem, weights):
+    """Apply the summed_max limit of the gas resource to the weighted sum of
+    the representative time steps."""
+    rgas = energysystem.groups['rgas']
+    bgas = energysystem.groups['natural_gas']
+    flow = om.flows[rgas, bgas]
+    om.Flow.summed_max[rgas, bgas].deactivate()
+    limit = (flow.summed_max * flow.nominal_value * weights.sum() /
+             len(weights))
+    om.weighted_gas_limit = po.Constraint(expr=sum(
+        w * om.flow[rgas, bgas, t] for t, w in zip(om.TIMESTEPS, weights))
+        <= limit)
+
+
+def link_storage(om, storage, aggregation):
+    """Replace the cyclic state of charge of the storage by intra-period
+    states (starting at zero in each representative period) and linked
+    inter-period states for the original sequence of periods."""
+    block = om.InvestmentStorage
+    period = aggregation.period
+    k = len(aggregation.medoids)
+    n_periods = len(aggregation.order)
+    bus_in = list(storage.inputs)[0]
+    bus_out = list(storage.outputs)[0]
+    capacity = block.capacity
+
+    for t in om.TIMESTEPS:
+        # intra-period state of charge may become negative
+        capacity[storage, t].domain = po.Reals
+        capacity[storage, t].setlb(None)
+        block.max_capacity[storage, t].deactivate()
+        if hasattr(block, 'min_capacity') and (storage, t) in block.min_capacity:
+            block.min_capacity[storage, t].deactivate()
+    if hasattr(block, 'initial_capacity') and storage in block.initial_capacity:
+        block.initial_capacity[storage].deactivate()
+
+    om.storage_linking = po.ConstraintList()
+    constraints = om.storage_linking
+    for t in om.TIMESTEPS:
+        if t % period == 0:
+            block.balance[storage, t].deactivate()
+            constraints.add(
+                capacity[storage, t] ==
+                om.flow[bus_in, storage, t] *
+                storage.inflow_conversion_factor[t] -
+                om.flow[storage, bus_out, t] /
+                storage.outflow_conversion_factor[t])
+
+    om.soc_inter = po.Var(range(n_periods + 1), within=po.NonNegativeReals)
+    om.soc_max = po.Var(range(k))
+    om.soc_min = po.Var(range(k))
+    for cluster in range(k):
+        for t in range(cluster * period, (cluster + 1) * period):
+            constraints.add(om.soc_max[cluster] >= capacity[storage, t])
+            constraints.add(om.soc_min[cluster] <= capacity[storage, t])
+
+    decay = (1 - storage.capacity_loss[0]) ** period
+    invest = block.invest[storage]
+    for number, cluster in enumerate(aggregation.order):
+        end = (cluster + 1) * period - 1
+        constraints.add(om.soc_inter[number + 1] ==
+                        om.soc_inter[number] * decay + capacity[storage, end])
+        constraints.add(om.soc_inter[number] + om.soc_max[cluster] <= invest)
+        constraints.add(om.soc_inter[number] + om.soc_min[cluster] >= 0)
+
+    constraints.add(om.soc_inter[0] == om.soc_inter[n_periods])
+    if storage.initial_capacity is not None:
+        constraints.add(om.soc_inter[0] == storage.initial_capacity * invest)
+
+
+def optimise_representative(filename="HSNR.csv", k=12, period=24,
+                            solvername='cbc', number_timesteps=8760,
+                            tee_switch=False, parameters=None,
+                            presolve=False, use_cache=True):
+    """Solve the model on k representative periods (see module docstring).
+
+    The Aggregation is attached to the returned EnergySystem as
+    'aggregation'.
+    """
+    data = HSNR.load_data(filename, use_cache=use_cache)
+    aggregation = aggregate(data, k, period=period,
+                            number_timesteps=number_timesteps,
+                            parameters=parameters)
+    logging.info('Aggregated {0} periods to {1} representative periods '
+                 '(profile RMSE {2:.4f})'.format(
+                     len(aggregation.order), k, aggregation.profile_error))
+
+    date_time_index = pd.date_range('1/1/2012', periods=len(aggregation.data),
+                                    freq='H')
+    energysystem = HSNR.create_energysystem(
+        aggregation.data, date_time_index, parameters=parameters,
+        presolve=presolve)
+    weight_variable_costs(energysystem, aggregation.weights)
+
+    om = solph.OperationalModel(energysystem)
+    weight_gas_limit(om, energysystem, aggregation.weights)
+    link_storage(om, energysystem.groups['storage'], aggregation)
+
+    logging.info('Solve the optimization problem')
+    HSNR.solve_model(om, energysystem, solvername=solvername,
+                     tee_switch=tee_switch)
+    energysystem.aggregation = aggregation
+    return energysystem
+
+
+def _storage_cap_and_objective(energysystem):
+    storage = energysystem.groups['storage']
+    return (float(energysystem.results[storage][storage].invest),
+            float(energysystem.results.objective))
+
+
+def error_report(ks, period=24, filename="HSNR.csv", solvername='cbc',
+                 number_timesteps=8760, parameters=None, reference=None):
+    """Solve the aggregated model for each k and compare storage_cap and
+    objective with the full-resolution solve.
+
+    reference: (storage_cap, objective) of the full solve; solved here if
+    not given. Returns a DataFrame with one row per k.
+    """
+    if reference is None:
+        start = time.time()
+        reference = _storage_cap_and_objective(HSNR.optimise_storage_size(
+            filename=filename, solvername=solvername, debug=False,
+            number_timesteps=number_timesteps, tee_switch=False,
+            parameters=parameters))
+        logging.info('Full resolution solve: {0:.1f} s'.format(
+            time.time() - start))
+    storage_cap, objective = reference
+
+    rows = []
+    for k in ks:
+        start = time.time()
+        energysystem = optimise_representative(
+            filename=filename, k=k, period=period, solvername=solvername,
+            number_timesteps=number_timesteps, parameters=parameters)
+        duration = time.time() - start
+        cap, obj = _storage_cap_and_objective(energysystem)
+        rows.append({
+            'k': k,
+            'timesteps': k * period,
+            'profile_rmse': energysystem.aggregation.profile_error,
+            'storage_cap': cap,
+            'objective': obj,
+            'storage_cap_error': (cap - storage_cap) / storage_cap
+            if storage_cap else np.nan,
+            'objective_error': (obj - objective) / objective
+            if objective else np.nan,
+            'time': duration})
+    return pd.DataFrame(rows).set_index('k')
@@ -0,0 +1,156 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Scaling benchmark of model build, solve and result extraction.
+
+The HSNR model is run for several horizons (number_timesteps) with every
+locally installed open-source LP solver (cbc, glpk, HiGHS). Each case runs in
+a fresh process, so the peak memory is measured per case. The results can be
+stored as baseline and compared with a later run; cases that got slower or
+need more memory than the threshold allows are flagged as regressions.
+
+Usage:
+
+    python benchmark.py --save                 # store a new baseline
+    python benchmark.py                        # compare with the baseline
+    python benchmark.py --steps 168 720 --solvers cbc --repeat 3
+
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+
+import pandas as pd
+
+
+STEPS = [168, 720, 2190, 8760]
+SOLVERS = ['cbc', 'glpk', 'appsi_highs']
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmarks', 'baseline.json')
+
+# Measured values and the phases of the RunReport they consist of
+MEASURES = {'build_time': ['load_data', 'create_objects', 'build_model'],
+            'solve_time': ['solve'],
+            'extraction_time': ['get_result_dict']}
+COMPARED = list(MEASURES) + ['peak_rss_mb']
+
+
+def available_solvers(solvers=SOLVERS):
+    from pyomo.opt import SolverFactory
+    return [s for s in solvers
+            if SolverFactory(s).available(exception_flag=False)]
+
+
+def environment():
+    """Versions of the software the benchmark ran with."""
+    import oemof
+    import pyomo.version
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'oemof': getattr(oemof, '__version__', None),
+            'pyomo': pyomo.version.version,
+            'pandas': pd.__version__,
+            'date': datetime.datetime.now().isoformat()}
+
+
+def run_case(case):
+    """Run one (number_timesteps, solvername) case and return its
+    measurements."""
+    number_timesteps, solvername = case
+    import HSNR
+    from profiling import RunReport
+
+    report = RunReport(number_timesteps=number_timesteps,
+                       solvername=solvername)
+    energysystem = HSNR.optimise_storage_size(
+        solvername=solvername, number_timesteps=number_timesteps,
+        tee_switch=False, report=report)
+    with report.phase('get_result_dict'):
+        result = HSNR.get_result_dict(energysystem)
+
+    phases = {p['phase']: p for p in report.phases}
+    row = {'number_timesteps': number_timesteps, 'solver': solvername}
+    for measure, names in MEASURES.items():
+        row[measure] = sum(phases[n]['wall_time'] for n in names)
+    row['peak_rss_mb'] = max(
+        (p['peak_rss_mb'] or 0) + (p['peak_rss_children_mb'] or 0)
+        for p in report.phases)
+    row.update(report.model)
+    row['objective'] = float(result['objective'])
+    return row
+
+
+def run_benchmark(steps=STEPS, solvers=None, repeat=1):
+    """Run all cases (each in a fresh process) and return the table with the
+    minimum over the repetitions."""
+    solvers = solvers or available_solvers()
+    cases = [(n, s) for n in steps for s in solvers] * repeat
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        rows = pool.map(run_case, cases, chunksize=1)
+    table = pd.DataFrame(rows).groupby(['number_timesteps', 'solver']).min()
+    return table
+
+
+def save_baseline(table, filename=BASELINE):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump({'environment': environment(),
+                   'results': table.reset_index().to_dict('records')},
+                  f, indent=2)
+
+
+def load_baseline(filename=BASELINE):
+    with open(filename) as f:
+        baseline = json.load(f)
+    table = pd.DataFrame(baseline['results'])
+    return table.set_index(['number_timesteps', 'solver']), \
+        baseline['environment']
+
+
+def compare(table, baseline, threshold=0.2):
+    """Ratio current / baseline of all compared measures for the cases in
+    both tables; 'regression' flags ratios above 1 + threshold."""
+    common = table.index.intersection(baseline.index)
+    ratio = table.loc[common, COMPARED] / baseline.loc[common, COMPARED]
+    ratio.columns = [c + '_ratio' for c in COMPARED]
+    ratio['regression'] = (ratio > 1 + threshold).any(axis=1)
+    return ratio
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description='HSNR scaling benchmark')
+    parser.add_argument('--steps', type=int, nargs='+', default=STEPS)
+    parser.add_argument('--solvers', nargs='+', default=None,
+                        help='default: all installed of {0}'.format(SOLVERS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative slowdown (default: 0.2)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as new baseline')
+    args = parser.parse_args()
+
+    table = run_benchmark(args.steps, args.solvers, args.repeat)
+    print(table.to_string())
+
+    if args.save:
+        save_baseline(table, args.baseline)
+        print('Baseline stored in {0}'.format(args.baseline))
+    elif os.path.isfile(args.baseline):
+        baseline, env = load_baseline(args.baseline)
+        report = compare(table, baseline, args.threshold)
+        print('\nCompared with baseline of {0} (oemof {1}, pyomo {2}):'
+              .format(env['date'], env['oemof'], env['pyomo']))
+        print(report.to_string())
+        if report['regression'].any():
+            sys.exit(1)
@@ -0,0 +1,141 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Binary column cache for the time series input (HSNR.csv) of the model.
+
+The csv file is parsed once ('n/e' -> NaN, every column float64, converted
+in one vectorized pass) and each column is stored as a .npy file in a
+directory named after the content hash of the csv file. Later runs only hash
+the file and memory-map the columns they need, so a changed csv file
+automatically gets a new cache entry.
+Without the cache read_columns parses only the requested columns.
+
+The cache lives in '.hsnr_cache' next to the csv file unless the environment
+variable HSNR_CACHE_DIR points somewhere else.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+MISSING = 'n/e'
+CACHE_DIRNAME = '.hsnr_cache'
+INDEX_FILENAME = 'columns.json'
+
+
+def file_hash(filename, blocksize=1 << 20):
+    """Return the sha256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_dir(filename):
+    return os.environ.get('HSNR_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+
+
+def fill(values, fill_missing=None, dtype=None):
+    """Convert an array to dtype and replace NaN by fill_missing (if not
+    None); copies only if needed."""
+    if dtype is not None:
+        values = values.astype(dtype, copy=False)
+    if fill_missing is not None:
+        missing = np.isnan(values)
+        if missing.any():
+            values = np.where(missing, values.dtype.type(fill_missing),
+                              values)
+    return values
+
+
+def fill_frame(data, fill_missing=None, dtype=None):
+    """Apply fill() to all columns of a DataFrame."""
+    return pd.DataFrame({c: fill(data[c].to_numpy(), fill_missing, dtype)
+                         for c in data.columns},
+                        columns=data.columns, copy=False)
+
+
+def read_columns(filename, columns=None, dtype=np.float64, fill_missing=None):
+    """Parse the given columns (all if None) of a csv time series file with
+    one dtype; 'n/e' becomes NaN or fill_missing."""
+    try:
+        data = pd.read_csv(filename, sep=",", usecols=columns,
+                           na_values=[MISSING], dtype=dtype)
+    except ValueError:
+        # other non-numeric entries: parse as text and coerce to NaN
+        data = pd.read_csv(filename, sep=",", usecols=columns,
+                           na_values=[MISSING], dtype=str)
+        data = data.apply(pd.to_numeric, errors='coerce').astype(dtype)
+    if columns is not None:
+        data = data[columns]
+    if fill_missing is not None:
+        data = data.fillna(fill_missing)
+    return data
+
+
+def build_cache(filename, path):
+    """Parse the csv file once and store every column as a .npy file."""
+    logging.info('Build column cache for {0}'.format(filename))
+    data = read_columns(filename)
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    index = {}
+    # column names may contain blanks ('other '), so the files are numbered
+    for number, column in enumerate(data.columns):
+        index[column] = 'c{0}.npy'.format(number)
+        np.save(os.path.join(tmp_path, index[column]),
+                np.ascontiguousarray(data[column].to_numpy()))
+    with open(os.path.join(tmp_path, INDEX_FILENAME), 'w') as f:
+        json.dump({'source': os.path.abspath(filename),
+                   'rows': len(data), 'columns': index}, f)
+
+    # another process may have built the same entry in the meantime
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_columns(filename, columns=None, mmap=True, dtype=None,
+                 fill_missing=None):
+    """Return the given columns of a csv time series file as DataFrame.
+
+    The columns are read from the binary cache (memory-mapped if `mmap`)
+    which is built on first use. All columns are returned if `columns` is
+    None. Columns stay memory-mapped unless they are converted to another
+    dtype (e.g. np.float32) or contain NaN to be replaced by fill_missing.
+    """
+    path = os.path.join(cache_dir(filename), file_hash(filename))
+    index_file = os.path.join(path, INDEX_FILENAME)
+    if not os.path.isfile(index_file):
+        build_cache(filename, path)
+    with open(index_file) as f:
+        index = json.load(f)['columns']
+
+    if columns is None:
+        columns = list(index)
+    missing = [c for c in columns if c not in index]
+    if missing:
+        raise KeyError('Columns {0} not found in {1}.'.format(
+            missing, filename))
+
+    mmap_mode = 'r' if mmap else None
+    return pd.DataFrame(
+        {c: fill(np.load(os.path.join(path, index[c]), mmap_mode=mmap_mode),
+                 fill_missing, dtype)
+         for c in columns}, columns=columns, copy=False)
@@ -0,0 +1,326 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Command line entry point of the HSNR model.
+
+The subcommands import oemof, pyomo, pandas and matplotlib only when they
+need them, so short-lived worker processes (and 'validate' or 'report')
+start fast. All settings that used to be function defaults (input file,
+solver, horizon, solver threads, time limit, output paths) are options.
+
+Usage:
+
+    python cli.py run --solver cbc --timesteps 8760 --threads 1 \\
+        --time-limit 600 --set solar=2 --output result.json
+    python cli.py sweep --grid solar=1,2,4 --grid wind_offshore=1,2 \\
+        --processes 32 --output sweep.csv
+    python cli.py scenarios design.npy --grid solar=1,2,4 \\
+        --grid storage_capex=500,1000,1500
+    python cli.py sweep --scenarios design.npy --processes 32
+    python cli.py queue jobs --grid solar=1,2,4 --solver cbc
+    python cli.py work jobs --processes 32 --output sweep.csv
+    python cli.py report 3f9c... snapshots/base --directory figures
+    python cli.py validate --filename HSNR.csv --timesteps 8760
+
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+
+def _assignments(items, convert=float):
+    """Parse ['name=value', ...] to a dict (values converted)."""
+    result = {}
+    for item in items or []:
+        name, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError('Expected NAME=VALUE, got {0!r}.'.format(item))
+        result[name.strip()] = convert(value)
+    return result
+
+
+def _values(text):
+    return [float(value) for value in text.split(',')]
+
+
+def _add_model_options(parser):
+    parser.add_argument('--filename', default='HSNR.csv',
+                        help='time series file (default: HSNR.csv)')
+    parser.add_argument('--solver', default='cbc', dest='solvername')
+    parser.add_argument('--timesteps', type=int, default=8760,
+                        dest='number_timesteps')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='solver threads (default: solver default)')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='solver time limit in seconds')
+    parser.add_argument('--presolve', action='store_true',
+                        help='aggregate the fixed profiles to a residual')
+    parser.add_argument('--dtype', default='float64',
+                        choices=['float64', 'float32'],
+                        help='dtype of the time series (float32 halves the '
+                             'memory per worker)')
+
+
+def run(args):
+    import HSNR
+    import store
+    from profiling import RunReport
+
+    parameters = _assignments(args.set)
+    result_store = store.ResultStore(args.store)
+    key, description, parameters = store.describe_run(
+        args.filename, args.solvername, args.number_timesteps, parameters,
+        args.presolve, args.time_limit, args.dtype)
+
+    result = None
+    if key in result_store and not args.force:
+        result = result_store.get(key)
+        if args.duals and 'price_mean' not in result:
+            result = None
+        else:
+            logging.info('Load results of {0} from {1}.'.format(
+                key, result_store.path))
+    if result is None:
+        report = RunReport(nonzeros=args.nonzeros,
+                           solvername=args.solvername,
+                           number_timesteps=args.number_timesteps)
+        energysystem = HSNR.optimise_storage_size(
+            filename=args.filename, solvername=args.solvername,
+            debug=args.debug, number_timesteps=args.number_timesteps,
+            tee_switch=args.tee, presolve=args.presolve,
+            parameters=parameters, report=report, duals=args.duals,
+            dtype=args.dtype,
+            cmdline_options=HSNR.solver_options(
+                args.solvername, args.threads, args.time_limit))
+        result = store.store_energysystem(result_store, key, description,
+                                          parameters, energysystem,
+                                          duals=args.duals, report=report)
+        if args.snapshot:
+            import snapshot
+            snapshot.save(energysystem, args.snapshot)
+        if args.report:
+            report.write(args.report)
+
+    if args.figures:
+        import render
+        render.render_source(key, args.figures, store_path=result_store.path)
+
+    text = json.dumps(dict(result, key=key), indent=2, default=float)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def _scenarios(args):
+    """Scenario matrix file (--scenarios) or grid (--grid) of the args."""
+    import sweep as sweep_module
+
+    if args.scenarios:
+        if args.grid:
+            raise ValueError('Give either --scenarios or --grid.')
+        return args.scenarios
+    if not args.grid:
+        raise ValueError('Give --scenarios or --grid.')
+    return sweep_module.grid(**_assignments(args.grid, convert=_values))
+
+
+def scenarios(args):
+    import scenarios as scenarios_module
+    from validate import ValidationError
+
+    try:
+        if args.csv:
+            matrix = scenarios_module.from_frame(args.csv)
+        else:
+            matrix = scenarios_module.design(
+                **_assignments(args.grid, convert=_values))
+    except ValidationError as e:
+        for problem in e.problems:
+            print('Error: ' + problem)
+        return 1
+    scenarios_module.save(args.output, matrix)
+    logging.info('Stored {0} scenarios in {1}.'.format(
+        scenarios_module.size(matrix), args.output))
+
+
+def sweep(args):
+    import sweep as sweep_module
+
+    table = sweep_module.run_sweep(
+        _scenarios(args), processes=args.processes,
+        solvername=args.solvername, threads=args.threads or 1,
+        time_limit=args.time_limit, filename=args.filename,
+        number_timesteps=args.number_timesteps, presolve=args.presolve,
+        dtype=args.dtype)
+    table.to_csv(args.output)
+    logging.info('Stored {0} scenarios in {1}.'.format(len(table),
+                                                       args.output))
+
+
+def queue(args):
+    import workqueue
+
+    workqueue.create(args.directory, _scenarios(args),
+                     filename=args.filename, solvername=args.solvername,
+                     number_timesteps=args.number_timesteps,
+                     presolve=args.presolve, time_limit=args.time_limit,
+                     dtype=args.dtype)
+    logging.info('Queue {0}: {1}'.format(args.directory,
+                                         workqueue.status(args.directory)))
+
+
+def work(args):
+    import workqueue
+
+    workqueue.run_workers(args.directory, processes=args.processes,
+                          threads=args.threads, heartbeat=args.heartbeat,
+                          stale=args.stale)
+    if args.output:
+        workqueue.results(args.directory).to_csv(args.output)
+
+
+def report(args):
+    import render
+
+    if args.table:
+        import store
+        store.ResultStore(args.store).table().to_csv(args.table)
+    if args.sources:
+        render.render_many(args.sources, args.directory, args.processes,
+                           store_path=args.store, max_points=args.max_points,
+                           fmt=args.format, dpi=args.dpi)
+
+
+def validate(args):
+    import HSNR
+    import validate as validate_module
+
+    data = HSNR.load_data(args.filename, fill_missing=None,
+                          columns=[HSNR.TIMESTEP_COLUMN] + HSNR.DATA_COLUMNS)
+    errors, warnings = validate_module.check(
+        data, args.number_timesteps, _assignments(args.set))
+    for warning in warnings:
+        print('Warning: ' + warning)
+    for error in errors:
+        print('Error: ' + error)
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='HSNR',
+                                     description='HSNR storage model')
+    parser.add_argument('--log-level', default='INFO')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    parser_run = subparsers.add_parser('run', help='solve one scenario')
+    _add_model_options(parser_run)
+    parser_run.add_argument('--set', action='append', metavar='NAME=VALUE',
+                            help='override a parameter of values.py')
+    parser_run.add_argument('--store', default=None,
+                            help='result store path (default: results)')
+    parser_run.add_argument('--force', action='store_true',
+                            help='solve even if the result is stored')
+    parser_run.add_argument('--output', default=None,
+                            help='result JSON file (default: stdout)')
+    parser_run.add_argument('--report', default=None,
+                            help='run report JSON file')
+    parser_run.add_argument('--nonzeros', action='store_true',
+                            help='count the nonzeros of the model for the '
+                                 'run report')
+    parser_run.add_argument('--snapshot', default=None,
+                            help='snapshot directory')
+    parser_run.add_argument('--figures', default=None,
+                            help='directory of the rendered plots')
+    parser_run.add_argument('--debug', action='store_true',
+                            help='write the lp file')
+    parser_run.add_argument('--duals', action='store_true',
+                            help='add shadow prices and market values')
+    parser_run.add_argument('--tee', action='store_true',
+                            help='show the solver output')
+    parser_run.set_defaults(func=run)
+
+    parser_sweep = subparsers.add_parser('sweep',
+                                         help='solve a parameter grid')
+    _add_model_options(parser_sweep)
+    parser_sweep.add_argument('--grid', action='append',
+                              metavar='NAME=V1,V2,...')
+    parser_sweep.add_argument('--scenarios', default=None,
+                              help='scenario matrix file instead of --grid')
+    parser_sweep.add_argument('--processes', type=int, default=None)
+    parser_sweep.add_argument('--output', default='sweep.csv')
+    parser_sweep.set_defaults(func=sweep)
+
+    parser_scenarios = subparsers.add_parser(
+        'scenarios', help='write a scenario matrix file')
+    parser_scenarios.add_argument('output', help='.npy file')
+    group = parser_scenarios.add_mutually_exclusive_group(required=True)
+    group.add_argument('--grid', action='append', metavar='NAME=V1,V2,...',
+                       help='full factorial design')
+    group.add_argument('--csv', default=None,
+                       help='csv file with one column per parameter')
+    parser_scenarios.set_defaults(func=scenarios)
+
+    parser_queue = subparsers.add_parser(
+        'queue', help='queue a parameter grid for resumable workers')
+    parser_queue.add_argument('directory', help='queue directory')
+    _add_model_options(parser_queue)
+    parser_queue.add_argument('--grid', action='append',
+                              metavar='NAME=V1,V2,...')
+    parser_queue.add_argument('--scenarios', default=None,
+                              help='scenario matrix file instead of --grid')
+    parser_queue.set_defaults(func=queue)
+
+    parser_work = subparsers.add_parser(
+        'work', help='solve the pending scenarios of a queue')
+    parser_work.add_argument('directory', help='queue directory')
+    parser_work.add_argument('--processes', type=int, default=None)
+    parser_work.add_argument('--threads', type=int, default=1,
+                             help='solver threads per process')
+    parser_work.add_argument('--heartbeat', type=float, default=60,
+                             help='seconds between heartbeats')
+    parser_work.add_argument('--stale', type=float, default=600,
+                             help='seconds without heartbeat until a claim '
+                                  'is recovered')
+    parser_work.add_argument('--output', default=None,
+                             help='csv file of all finished scenarios')
+    parser_work.set_defaults(func=work)
+
+    parser_report = subparsers.add_parser(
+        'report', help='render plots of stored results or snapshots')
+    parser_report.add_argument('sources', nargs='*',
+                               help='snapshot directories or store keys')
+    parser_report.add_argument('--store', default=None)
+    parser_report.add_argument('--table', default=None,
+                               help='csv file of all stored runs')
+    parser_report.add_argument('--directory', default='figures')
+    parser_report.add_argument('--processes', type=int, default=None)
+    parser_report.add_argument('--max-points', type=int, default=2000)
+    parser_report.add_argument('--format', default='png')
+    parser_report.add_argument('--dpi', type=int, default=100)
+    parser_report.set_defaults(func=report)
+
+    parser_validate = subparsers.add_parser(
+        'validate', help='check the input data without solving')
+    parser_validate.add_argument('--filename', default='HSNR.csv')
+    parser_validate.add_argument('--timesteps', type=int, default=8760,
+                                 dest='number_timesteps')
+    parser_validate.add_argument('--set', action='append',
+                                 metavar='NAME=VALUE',
+                                 help='override a parameter of values.py')
+    parser_validate.set_defaults(func=validate)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
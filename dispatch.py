@@ -0,0 +1,196 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Receding-horizon dispatch of pp_gas and storage for a given storage size
+(operation instead of sizing).
+
+A small model of the next `horizon` hours (e.g. 24 - 48) is built once and
+kept resident. For every step the fixed profiles of the window are updated in
+place (parametric.fix_flow), the realized state of charge is set as initial
+state (rolling.set_initial_soc, mutable Param) and the model is re-solved:
+in memory and incrementally for appsi solvers, with a warm start for shell
+solvers. The first `commit` hours are committed and the window moves on.
+
+The storage investment is fixed to the given capacity and the annual gas
+limit (summed_max) is not applied to the short window unless gas_limit is
+set. With presolve (default) only the two residual flows change per step.
+
+Usage:
+
+    result = run_dispatch(storage_cap=2.5e6, horizon=24, commit=1,
+                          solvername='appsi_highs')
+    result.flows, result.soc, result.latency.describe()
+
+    model = DispatchModel(2.5e6, forecast, horizon=48)
+    flows, soc = model.step(forecast_of_next_48_hours)
+
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+from pyomo.opt import SolverFactory
+import oemof.solph as solph
+
+import HSNR
+from parametric import fix_flow
+from rolling import bus_flow_values, set_initial_soc
+
+
+class DispatchResult(object):
+    """Committed hourly flows of the electricity bus (columns (type,
+    label)), state of charge and solve latency [s] of every step."""
+
+    def __init__(self, flows, soc, latency):
+        self.flows = flows
+        self.soc = soc
+        self.latency = latency
+
+
+class DispatchModel(object):
+    """Resident dispatch model of `horizon` hours with fixed storage size
+    (see module docstring)."""
+
+    def __init__(self, storage_cap, data, horizon=24, solvername='cbc',
+                 parameters=None, presolve=True, soc=0.0, gas_limit=False,
+                 tee_switch=False, cmdline_options=None):
+        self.horizon = horizon
+        self.solvername = solvername
+        self.parameters = HSNR.get_parameters(parameters)
+        self.presolve = presolve
+        self.tee_switch = tee_switch
+        self.index = pd.RangeIndex(horizon)
+
+        window = data.iloc[:horizon].reset_index(drop=True)
+        self.energysystem = HSNR.create_energysystem(
+            window, pd.date_range('1/1/2012', periods=horizon, freq='H'),
+            parameters=self.parameters, presolve=presolve)
+        groups = self.energysystem.groups
+        self.storage = groups['storage']
+        self.bel = groups['electricity']
+
+        logging.info('Build the dispatch model')
+        self.om = solph.OperationalModel(self.energysystem)
+        self.om.InvestmentStorage.invest[self.storage].fix(storage_cap)
+        set_initial_soc(self.om, self.storage, soc)
+        if not gas_limit:
+            self.om.Flow.summed_max[groups['rgas'],
+                                    groups['natural_gas']].deactivate()
+
+        self.opt = SolverFactory(solvername)
+        for key, value in (cmdline_options or {}).items():
+            self.opt.options[key] = value
+        self.warmstart = (not HSNR.is_direct_solver(solvername) and
+                          self.opt.warm_start_capable())
+        self.solved = False
+
+    @property
+    def soc(self):
+        return po.value(self.om.initial_soc)
+
+    @soc.setter
+    def soc(self, value):
+        self.om.initial_soc.value = value
+
+    def set_profiles(self, window):
+        """Fix the demand and fixed feed-in of the window (horizon rows of
+        HSNR.DATA_COLUMNS); returns the fixed profiles."""
+        om = self.om
+        groups = self.energysystem.groups
+        profiles = HSNR.fixed_profiles(window, self.index, self.parameters)
+        if self.presolve:
+            residual = (profiles['demand'] -
+                        profiles[HSNR.FIXED_SOURCES].sum(axis=1)).to_numpy()
+            fix_flow(om, self.bel, groups['residual_demand'],
+                     np.maximum(residual, 0))
+            fix_flow(om, groups['residual_supply'], self.bel,
+                     np.maximum(-residual, 0))
+        else:
+            fix_flow(om, self.bel, groups['demand'], profiles['demand'])
+            for label in HSNR.FIXED_SOURCES:
+                fix_flow(om, groups[label], self.bel, profiles[label])
+        return profiles
+
+    def solve(self):
+        """Re-solve the resident model; values are loaded into the model."""
+        if self.solvername.startswith('appsi_'):
+            # appsi solvers keep the model and only apply the changes
+            results = self.opt.solve(self.om, tee=self.tee_switch)
+        elif HSNR.is_direct_solver(self.solvername):
+            self.opt.set_instance(self.om)
+            results = self.opt.solve(self.om, tee=self.tee_switch)
+        else:
+            results = self.opt.solve(
+                self.om, tee=self.tee_switch,
+                warmstart=self.warmstart and self.solved)
+        if not po.check_optimal_termination(results):
+            raise RuntimeError('Dispatch model not solved to optimality: '
+                               '{0}'.format(
+                                   results.solver.termination_condition))
+        self.solved = True
+        return results
+
+    def step(self, window, commit=1):
+        """Solve for the window and commit its first `commit` hours; the
+        state of charge at their end is the start of the next step.
+        Returns the committed flows of the electricity bus and the state of
+        charge."""
+        profiles = self.set_profiles(window)
+        self.solve()
+
+        flows = bus_flow_values(self.om, self.bel, commit)
+        if self.presolve:
+            flows = HSNR.expand_residual_flows(flows,
+                                               profiles.iloc[:commit])
+        capacity = self.om.InvestmentStorage.capacity
+        soc = np.array([capacity[self.storage, t].value
+                        for t in list(self.om.TIMESTEPS)[:commit]],
+                       dtype=float)
+        self.soc = soc[-1]
+        return flows, soc
+
+
+def run_dispatch(storage_cap, filename="HSNR.csv", horizon=24, commit=1,
+                 number_timesteps=None, start='1/1/2012', solvername='cbc',
+                 parameters=None, presolve=True, soc=0.0, gas_limit=False,
+                 cmdline_options=None):
+    """Dispatch the time series of filename step by step with perfect
+    foresight over the horizon (the last windows are filled with the last
+    row)."""
+    if not 0 < commit <= horizon:
+        raise ValueError('commit must be between 1 and horizon.')
+    data = HSNR.load_data(filename)
+    number_timesteps = number_timesteps or len(data)
+    model = DispatchModel(storage_cap, data, horizon=horizon,
+                          solvername=solvername, parameters=parameters,
+                          presolve=presolve, soc=soc, gas_limit=gas_limit,
+                          cmdline_options=cmdline_options)
+
+    flows, socs, latency = [], [], []
+    for first in range(0, number_timesteps, commit):
+        window = data.reindex(pd.RangeIndex(first, first + horizon)).ffill()
+        steps = min(commit, number_timesteps - first)
+        started = time.perf_counter()
+        committed, soc_values = model.step(window.reset_index(drop=True),
+                                           steps)
+        latency.append(time.perf_counter() - started)
+        flows.append(committed)
+        socs.append(soc_values)
+
+    date_time_index = pd.date_range(start, periods=number_timesteps,
+                                    freq='H')
+    flows = pd.concat(flows, ignore_index=True).fillna(0)
+    flows.index = date_time_index
+    latency = pd.Series(latency, index=date_time_index[::commit],
+                        name='latency')
+    logging.info('Dispatch of {0} steps, median latency {1:.3f} s'.format(
+        len(latency), latency.median()))
+    return DispatchResult(flows, pd.Series(np.concatenate(socs),
+                                           index=date_time_index),
+                          latency)
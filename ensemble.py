@@ -0,0 +1,264 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Ensemble runs of the HSNR model over alternative input years or synthetic
+profile variants with online statistics.
+
+The members (time series files in the format of HSNR.csv or DataFrames, e.g.
+from synthetic_years) are streamed to the workers of a process pool with a
+bounded number of members in flight. Every finished run is folded into the
+statistics and dropped:
+
+ * mean and variance with Welford's algorithm,
+ * quantiles with the P-square algorithm (Jain & Chlamtac 1985), which keeps
+   five markers per quantile instead of all observations,
+
+both for the values of get_result_dict and, element-wise, for the hourly
+flows of the electricity bus. Memory stays flat in the number of members.
+
+Usage:
+
+    statistics = run_ensemble(['HSNR.csv', 'HSNR_2016.csv'], processes=4)
+    statistics = run_ensemble(synthetic_years(HSNR.load_data(), 100))
+    statistics.results()                 # storage_cap, ... distribution
+    statistics.dispatch('q95')           # hourly 95 % quantile of the flows
+
+"""
+
+import functools
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+class Welford(object):
+    """Running mean and variance of arrays of a fixed shape."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.count == 0:
+            self.mean = np.zeros_like(values)
+            self._m2 = np.zeros_like(values)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (values - self.mean)
+
+    @property
+    def variance(self):
+        """Sample variance (NaN for less than two observations)."""
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - 1)
+
+
+class P2Quantile(object):
+    """Running estimate of the p-quantile of arrays of a fixed shape with
+    the P-square algorithm (element-wise, vectorized)."""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._first = []
+        self._heights = None
+        self._positions = None
+        self._desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self._increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count += 1
+        if self.count <= 5:
+            self._first.append(values)
+            if self.count == 5:
+                self._heights = np.sort(np.array(self._first), axis=0)
+                self._positions = np.broadcast_to(
+                    np.arange(5.).reshape((5,) + (1,) * values.ndim),
+                    self._heights.shape).copy()
+                self._first = []
+            return
+
+        q = self._heights
+        n = self._positions
+        q[0] = np.minimum(q[0], values)
+        q[4] = np.maximum(q[4], values)
+        cell = (values >= q[1]).astype(int) + (values >= q[2]) + \
+            (values >= q[3])
+        for i in range(1, 5):
+            n[i] += cell < i
+        self._desired += self._increments
+
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            step = np.where((d >= 1) & (n[i + 1] - n[i] > 1), 1.,
+                            np.where((d <= -1) & (n[i - 1] - n[i] < -1),
+                                     -1., 0.))
+            if not step.any():
+                continue
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) /
+                (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) /
+                (n[i] - n[i - 1]))
+            neighbour_q = np.where(step > 0, q[i + 1], q[i - 1])
+            neighbour_n = np.where(step > 0, n[i + 1], n[i - 1])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                linear = q[i] + step * (neighbour_q - q[i]) / (
+                    neighbour_n - n[i])
+            inside = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(step == 0, q[i],
+                            np.where(inside, parabolic, linear))
+            n[i] += step
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            return np.percentile(np.array(self._first), self.p * 100, axis=0)
+        return self._heights[2].copy()
+
+
+class Statistics(object):
+    """Mean, standard deviation and quantiles of the results (keys of
+    get_result_dict) and of the hourly flows of the ensemble members."""
+
+    def __init__(self, quantiles=QUANTILES, flow_quantiles=QUANTILES):
+        self.keys = None
+        self.columns = None
+        self.timeindex = None
+        self.failed = 0
+        self._results = Welford()
+        self._flows = Welford()
+        self._result_quantiles = [P2Quantile(p) for p in quantiles]
+        self._flow_quantiles = [P2Quantile(p) for p in flow_quantiles]
+
+    @property
+    def count(self):
+        return self._results.count
+
+    def update(self, result, flows):
+        """Fold one run (result dict, flows DataFrame of HSNR.bus_flows)
+        into the statistics."""
+        if self.keys is None:
+            self.keys = sorted(result)
+            self.columns = flows.columns
+            self.timeindex = flows.index
+        elif not flows.columns.equals(self.columns):
+            raise ValueError('Flows of the members differ: {0}'.format(
+                list(flows.columns)))
+        values = np.array([float(np.sum(result[key])) for key in self.keys])
+        self._results.update(values)
+        for quantile in self._result_quantiles:
+            quantile.update(values)
+        values = flows.to_numpy(dtype=float)
+        self._flows.update(values)
+        for quantile in self._flow_quantiles:
+            quantile.update(values)
+
+    def _table(self, welford, quantiles):
+        table = {'mean': welford.mean,
+                 'std': np.sqrt(welford.variance)}
+        for quantile in quantiles:
+            table['q{0:g}'.format(quantile.p * 100)] = quantile.value
+        return table
+
+    def results(self):
+        """DataFrame: one row per result value, columns mean, std and the
+        quantiles (q5, q50, q95)."""
+        return pd.DataFrame(self._table(self._results,
+                                        self._result_quantiles),
+                            index=self.keys)
+
+    def dispatch(self, statistic='mean'):
+        """Hourly statistic ('mean', 'std', 'q50', ...) of the flows of the
+        electricity bus, columns (type, label)."""
+        return pd.DataFrame(
+            self._table(self._flows, self._flow_quantiles)[statistic],
+            index=self.timeindex, columns=self.columns)
+
+
+def synthetic_years(data, number, block=168, seed=None):
+    """Generate `number` synthetic input years by drawing whole blocks
+    (default: weeks) of the given time series at random (block bootstrap,
+    keeps the correlation between demand and feed-in)."""
+    rng = np.random.default_rng(seed)
+    n_blocks = len(data) // block
+    values = data.to_numpy()
+    for _ in range(number):
+        blocks = rng.integers(0, n_blocks, size=-(-len(data) // block))
+        rows = (blocks[:, None] * block + np.arange(block)).ravel()
+        yield pd.DataFrame(values[rows[:len(data)]], columns=data.columns)
+
+
+def run_member(member, solvername='cbc', **kwargs):
+    """Solve one member (file name or DataFrame); returns the result dict
+    and the flows of the electricity bus or None if it failed."""
+    import HSNR
+
+    if isinstance(member, str):
+        kwargs['filename'] = member
+    else:
+        kwargs['data'] = member
+    try:
+        energysystem = HSNR.optimise_storage_size(
+            solvername=solvername, tee_switch=False, **kwargs)
+        flows = HSNR.bus_flows(energysystem)
+        return HSNR.get_result_dict(energysystem), flows
+    except Exception:
+        logging.exception('Ensemble member {0} failed'.format(
+            member if isinstance(member, str) else 'DataFrame'))
+        return None
+
+
+def run_ensemble(members, processes=None, solvername='cbc', threads=1,
+                 quantiles=QUANTILES, flow_quantiles=QUANTILES, **kwargs):
+    """Solve all members in a process pool and return the Statistics.
+
+    At most two members per process are in flight, so a generator of
+    members is consumed only as fast as the runs finish. Further keyword
+    arguments (number_timesteps, parameters, presolve, dtype, ...) are
+    passed to optimise_storage_size.
+    """
+    import HSNR
+    from sweep import _init_worker
+
+    processes = processes or os.cpu_count()
+    statistics = Statistics(quantiles, flow_quantiles)
+    worker = functools.partial(
+        run_member, solvername=solvername,
+        cmdline_options=HSNR.solver_options(solvername, threads), **kwargs)
+
+    def fold(run):
+        if run is None:
+            statistics.failed += 1
+        else:
+            statistics.update(*run)
+
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(threads,)) as pool:
+        pending = []
+        for member in members:
+            pending.append(pool.apply_async(worker, (member,)))
+            while len(pending) >= 2 * processes:
+                fold(pending.pop(0).get())
+        for run in pending:
+            fold(run.get())
+
+    logging.info('Ensemble of {0} members ({1} failed)'.format(
+        statistics.count + statistics.failed, statistics.failed))
+    return statistics
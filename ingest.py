@@ -0,0 +1,257 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Ingestion of ENTSOE "Actual Generation per Production Type" exports into the
+time series file of the HSNR model (HSNR.csv).
+
+Every "<Production type>  - Actual Aggregated [MW]" column of the ENTSOE
+export is mapped onto the matching column name of HSNR.csv in one pass and
+the merged table is written once. Entries marked with 'n/e' (not expected)
+are treated as missing values.
+
+The MTU strings of the export ("01.01.2016 00:00 - 01.01.2016 00:15 (CET)")
+are parsed into a UTC timestamp index, so CET/CEST transitions and leap years
+are handled, and the 15 minute values are aggregated to the resolution of
+HSNR.csv (one row per hour by default) before they are merged.
+
+Usage:
+
+    python ingest.py ENTSOE.csv --hsnr HSNR.csv --freq h
+
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Marker used by ENTSOE (and in HSNR.csv) for values that are not expected
+MISSING = 'n/e'
+
+AGGREGATED_SUFFIX = '- Actual Aggregated [MW]'
+
+# Time zone of the MTU strings and UTC offsets (hours) of the zone labels
+MTU_TIMEZONE = 'Europe/Berlin'
+MTU_OFFSETS = {'UTC': 0, 'CET': 1, 'CEST': 2}
+
+# ENTSOE production type -> column name in HSNR.csv
+# ('other ' carries a trailing space in HSNR.csv)
+ENTSOE_COLUMNS = {
+    'Biomass': 'biomass',
+    'Fossil Brown coal/Lignite': 'brown_lig',
+    'Fossil Coal-derived gas': 'coal_derived_gas',
+    'Fossil Gas': 'fossil_gas',
+    'Fossil Hard coal': 'fossil_hardcoal',
+    'Fossil Oil': 'fossil_oil',
+    'Fossil Oil shale': 'fossil_oil_shale',
+    'Fossil Peat': 'fossil_peat',
+    'Geothermal': 'geothermal',
+    'Hydro Pumped Storage': 'hydro_pumped_storage',
+    'Hydro Run-of-river and poundage': 'run_of_river',
+    'Hydro Water Reservoir': 'hydro_water_reservoir',
+    'Marine': 'marine',
+    'Nuclear': 'nuclear',
+    'Other': 'other ',
+    'Other renewable': 'other_renewable',
+    'Solar': 'solar',
+    'Waste': 'waste',
+    'Wind Offshore': 'wind_offshore',
+    'Wind Onshore': 'wind_onshore',
+}
+
+
+def production_type(column):
+    """Return the production type of an ENTSOE 'Actual Aggregated' column
+    header or None for all other columns."""
+    if not column.endswith(AGGREGATED_SUFFIX):
+        return None
+    return ' '.join(column[:-len(AGGREGATED_SUFFIX)].split())
+
+
+def read_entsoe(filename):
+    """Read all 'Actual Aggregated' columns of an ENTSOE export.
+
+    The columns are renamed to the HSNR.csv names, 'n/e' and empty entries
+    become NaN. 'Area' and 'MTU' are kept as they are.
+    """
+    header = pd.read_csv(filename, nrows=0).columns
+    rename = {}
+    for column in header:
+        ptype = production_type(column)
+        if ptype is None:
+            continue
+        if ptype not in ENTSOE_COLUMNS:
+            logging.warning(
+                'Unknown ENTSOE production type {0!r} skipped.'.format(ptype))
+            continue
+        rename[column] = ENTSOE_COLUMNS[ptype]
+    usecols = [c for c in ('Area', 'MTU') if c in header] + list(rename)
+
+    entsoe = pd.read_csv(filename, usecols=usecols, na_values=[MISSING],
+                         dtype={c: np.float64 for c in rename})
+    return entsoe.rename(columns=rename)
+
+
+def parse_mtu(mtu, tz=MTU_TIMEZONE):
+    """Parse ENTSOE MTU strings into a UTC DatetimeIndex of interval starts.
+
+    Rows labelled with (CET), (CEST) or (UTC) are shifted by their fixed
+    offset. Exports labelled (CET/CEST) are localized to `tz`, the repeated
+    hour in October is inferred from the row order and the skipped hour in
+    March becomes NaT.
+    """
+    mtu = pd.Series(mtu)
+    start = pd.to_datetime(mtu.str.slice(0, 16), format='%d.%m.%Y %H:%M')
+    zone = mtu.str.extract(r'\(([A-Z/]+)\)\s*$', expand=False)
+    offset = zone.map(MTU_OFFSETS)
+
+    if offset.notna().all():
+        utc = start - pd.to_timedelta(offset.to_numpy(), unit='h')
+        return pd.DatetimeIndex(utc).tz_localize('UTC')
+
+    local = pd.DatetimeIndex(start).tz_localize(tz, ambiguous='infer',
+                                                nonexistent='NaT')
+    return local.tz_convert('UTC')
+
+
+def resample(entsoe, freq='h', drop_leap_day=False, tz=MTU_TIMEZONE):
+    """Aggregate an ENTSOE table to the resolution `freq`.
+
+    The result is indexed by UTC interval starts and holds the mean power
+    [MW] per interval, so energies are preserved. Bins are anchored at the
+    first interval of the export (e.g. local midnight for 2h/4h). Finer
+    resolutions than the export repeat the values. With `drop_leap_day`
+    the 29th of February (local time) is removed to fit a 8760 hour year.
+    """
+    if 'Area' in entsoe and entsoe['Area'].nunique() > 1:
+        raise ValueError('ENTSOE export contains several areas, select one.')
+
+    index = parse_mtu(entsoe['MTU'], tz=tz)
+    values = entsoe.drop(columns=[c for c in ('Area', 'MTU') if c in entsoe])
+    values = values.set_axis(index)[index.notna()]
+    values = values[~values.index.duplicated(keep='first')].sort_index()
+
+    target = pd.tseries.frequencies.to_offset(freq)
+    step = values.index.to_series().diff().min()
+    result = values.resample(target, origin='start').mean()
+    if pd.Timedelta(target) < step:
+        result = result.ffill(limit=int(step / pd.Timedelta(target)) - 1)
+
+    if drop_leap_day:
+        local = result.index.tz_convert(tz)
+        result = result[~((local.month == 2) & (local.day == 29))]
+    return result
+
+
+def _as_integer(series):
+    """Store integral columns as nullable integers to keep the plain integer
+    notation of HSNR.csv."""
+    values = series.to_numpy()
+    finite = values[~np.isnan(values)]
+    if finite.size and np.array_equal(finite, np.round(finite)):
+        return series.astype('Int64')
+    return series
+
+
+def _as_text(values):
+    """Format values in the notation of HSNR.csv (integers where possible,
+    MISSING for NaN)."""
+    return np.array([MISSING if np.isnan(v) else
+                     str(int(v)) if v == round(v) else repr(float(v))
+                     for v in values], dtype=object)
+
+
+def merge_entsoe(hsnr, entsoe, partial=False):
+    """Replace (or append) every mapped ENTSOE column in the HSNR table.
+
+    The rows are matched by position (use `resample` first to get one row
+    per time step of HSNR.csv). An export with another number of rows than
+    the HSNR table is refused unless `partial` is set: then only the rows
+    the export covers are replaced, surplus ENTSOE rows are dropped and all
+    other rows keep their values (appended columns are NaN there).
+    """
+    if len(entsoe) != len(hsnr) and not partial:
+        raise ValueError(
+            'ENTSOE export has {0} rows, HSNR table {1}; use partial to '
+            'replace only the covered rows.'.format(len(entsoe), len(hsnr)))
+    merged = hsnr.copy()
+    columns = [c for c in entsoe.columns if c not in ('Area', 'MTU')]
+    covered = min(len(entsoe), len(merged))
+    block = entsoe[columns].iloc[:covered]
+    for column in columns:
+        values = block[column].to_numpy()
+        if column not in merged:
+            merged[column] = np.nan
+        elif merged[column].dtype.kind != 'f':
+            # integer or text column (other markers like 'N/A'): keep the
+            # other rows as they are
+            merged[column] = merged[column].astype(object)
+            values = _as_text(values)
+        merged.iloc[:covered, merged.columns.get_loc(column)] = values
+    for column in merged.columns:
+        if merged[column].dtype.kind == 'f':
+            merged[column] = _as_integer(merged[column])
+    return merged
+
+
+def write_hsnr(frame, filename):
+    """Write the merged table once and replace the target atomically."""
+    tmp_filename = filename + '.tmp'
+    frame.to_csv(tmp_filename, index=False, na_rep=MISSING)
+    os.replace(tmp_filename, filename)
+
+
+def ingest(entsoe_filename, hsnr_filename='HSNR.csv', output=None, freq='h',
+           area=None, drop_leap_day=True, partial=False):
+    """Merge all generation columns of an ENTSOE export into HSNR.csv.
+
+    The export is aggregated to `freq` first (None keeps the raw rows). An
+    export that does not cover all rows of HSNR.csv is only merged with
+    `partial` (see merge_entsoe).
+    """
+    logging.info('Read {0}'.format(entsoe_filename))
+    entsoe = read_entsoe(entsoe_filename)
+    if area is not None:
+        entsoe = entsoe[entsoe['Area'] == area]
+    if freq is not None:
+        entsoe = resample(entsoe, freq, drop_leap_day=drop_leap_day)
+    hsnr = pd.read_csv(hsnr_filename, na_values=[MISSING],
+                       keep_default_na=False)
+
+    merged = merge_entsoe(hsnr, entsoe, partial=partial)
+
+    output = output or hsnr_filename
+    logging.info('Write {0}'.format(output))
+    write_hsnr(merged, output)
+    return merged
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description='Merge an ENTSOE generation export into HSNR.csv')
+    parser.add_argument('entsoe', help='ENTSOE export (csv)')
+    parser.add_argument('--hsnr', default='HSNR.csv',
+                        help='HSNR time series file (default: HSNR.csv)')
+    parser.add_argument('--output', default=None,
+                        help='output file (default: overwrite --hsnr)')
+    parser.add_argument('--freq', default='h',
+                        help='target resolution, e.g. 15min, h, 2h, 4h '
+                             '(default: h)')
+    parser.add_argument('--area', default=None,
+                        help='select one area of a multi-area export')
+    parser.add_argument('--keep-leap-day', action='store_true',
+                        help='keep the 29th of February in leap years')
+    parser.add_argument('--partial', action='store_true',
+                        help='merge an export shorter or longer than '
+                             'HSNR.csv (only the covered rows change)')
+    args = parser.parse_args()
+    ingest(args.entsoe, args.hsnr, args.output, freq=args.freq,
+           area=args.area, drop_leap_day=not args.keep_leap_day,
+           partial=args.partial)
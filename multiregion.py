@@ -0,0 +1,256 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Multi-region variant of the HSNR model (e.g. several bidding zones).
+
+The regions are given as table (DataFrame or csv file) with the columns
+'region' and 'filename' (time series file in the format of HSNR.csv) and
+optionally any parameter of HSNR.PARAMETERS, which overrides the defaults
+of values.py for that region. Every region gets its own set of buses and
+components (HSNR.create_region, labels with the suffix '_<region>').
+
+The interconnectors are given as table with the columns 'from', 'to' and
+'capacity' [MW] and optionally 'efficiency' (default 1). Each interconnector
+becomes two LinearTransformers 'transmission_<from>_<to>' and
+'transmission_<to>_<from>' between the electricity buses. Nodes are only
+created per region and per interconnector, so build time and memory grow
+linearly with the number of regions.
+
+The input is validated for the coupled system (check_regions): the time
+series of each region on their own, the balance with the imports over the
+interconnectors, so a region without gas can be supplied by its neighbour.
+
+Usage:
+
+    regions = pd.DataFrame({'region': ['DE', 'NL'],
+                            'filename': ['HSNR.csv', 'NL.csv'],
+                            'solar': [1, 0.3]})
+    links = pd.DataFrame({'from': ['DE'], 'to': ['NL'], 'capacity': [4000]})
+    energysystem = optimise_multiregion(regions, links)
+    region_result_dict(energysystem, 'NL')
+
+"""
+
+import logging
+
+import pandas as pd
+
+import HSNR
+import cache
+import validate
+from profiling import phase
+
+
+REGION_COLUMNS = ['region', 'filename']
+LINK_COLUMNS = ['from', 'to', 'capacity']
+
+
+def read_table(table, required):
+    """Return the table (DataFrame or csv file name) after checking that
+    the required columns exist."""
+    if isinstance(table, str):
+        table = pd.read_csv(table)
+    missing = [c for c in required if c not in table.columns]
+    if missing:
+        raise ValueError('Columns {0} missing.'.format(missing))
+    return table
+
+
+def region_parameters(regions, parameters=None):
+    """Complete parameters of every region: values.py, overridden by
+    parameters, overridden by the columns of the region table."""
+    base = HSNR.get_parameters(parameters)
+    columns = [c for c in regions.columns if c not in REGION_COLUMNS]
+    unknown = sorted(set(columns) - set(HSNR.PARAMETERS))
+    if unknown:
+        raise ValueError('Unknown parameters {0} in the region table.'.format(
+            unknown))
+    result = {}
+    for row in regions.to_dict('records'):
+        overrides = {c: row[c] for c in columns if not pd.isnull(row[c])}
+        result[row['region']] = dict(base, **overrides)
+    return result
+
+
+def _efficiencies(links):
+    return (links['efficiency'] if 'efficiency' in links.columns
+            else pd.Series(1.0, index=links.index))
+
+
+def import_capacities(links):
+    """Maximum import power [MW] of every region over its interconnectors
+    (capacity times efficiency, both directions)."""
+    delivered = links['capacity'] * _efficiencies(links)
+    return (delivered.groupby(links['to']).sum()
+            .add(delivered.groupby(links['from']).sum(), fill_value=0))
+
+
+def check_regions(frames, links, number_timesteps, parameters):
+    """Return the lists of errors and warnings of the coupled regions.
+
+    The time series of every region are checked on their own (rows, gaps,
+    missing and negative values). The balance is checked per region with
+    the imports over its interconnectors and for the whole system, where
+    the surplus of one region can cover the deficit of another.
+    """
+    errors, warnings = [], []
+    imports = import_capacities(links)
+    deficit, coverable = 0.0, 0.0
+    for region, data in frames.items():
+        region_errors, region_warnings, values = validate.check_data(
+            data, number_timesteps)
+        if values is not None:
+            residual = validate.residual_demand(values, parameters[region])
+            balance_errors, balance_warnings = validate.check_balance(
+                residual, parameters[region], imports.get(region, 0.0))
+            region_errors += balance_errors
+            region_warnings += balance_warnings
+            gas_energy = validate.gas_limits(parameters[region],
+                                             len(residual))[1]
+            deficit += residual[residual > 0].sum()
+            # surplus exported directly is an upper bound of the storage
+            coverable += (gas_energy * HSNR.PP_GAS_CONVERSION -
+                          residual[residual < 0].sum())
+        errors += ['{0}: {1}'.format(region, p) for p in region_errors]
+        warnings += ['{0}: {1}'.format(region, p) for p in region_warnings]
+    if not errors and deficit > coverable:
+        errors.append('Residual demand of all regions of {0:.4g} MWh exceeds '
+                      'their gas limits plus surplus: at most {1:.4g} '
+                      'MWh.'.format(deficit, coverable))
+    return errors, warnings
+
+
+def load_regions(regions, links, number_timesteps, parameters,
+                 use_cache=True, validate_input=True):
+    """Load the time series of all regions (dict region: DataFrame, missing
+    values as zero); with validate_input they are checked together first
+    (see check_regions)."""
+    frames = {}
+    for region, filename in zip(regions['region'], regions['filename']):
+        frames[region] = HSNR.load_data(
+            filename, use_cache=use_cache, fill_missing=None,
+            columns=[HSNR.TIMESTEP_COLUMN] + HSNR.DATA_COLUMNS
+            if validate_input else None)
+    if validate_input:
+        errors, warnings = check_regions(frames, links, number_timesteps,
+                                         parameters)
+        for warning in warnings:
+            logging.warning(warning)
+        if errors:
+            raise validate.ValidationError(errors)
+    return {region: cache.fill_frame(data[HSNR.DATA_COLUMNS], 0.0)
+            for region, data in frames.items()}
+
+
+def create_multiregion(regions, links, date_time_index, parameters=None,
+                       presolve=False, use_cache=True, validate_input=True):
+    """Create the EnergySystem of all regions and interconnectors.
+
+    The region parameters and (if presolve) the fixed profiles per region
+    are stored at the EnergySystem as 'region_parameters' and
+    'region_profiles'.
+    """
+    import oemof.solph as solph
+
+    regions = read_table(regions, REGION_COLUMNS)
+    links = read_table(links, LINK_COLUMNS)
+    if regions['region'].duplicated().any():
+        raise ValueError('Regions must be unique.')
+    unknown = sorted(set(links['from']).union(links['to']) -
+                     set(regions['region']))
+    if unknown:
+        raise ValueError('Interconnectors to unknown regions {0}.'.format(
+            unknown))
+    number_timesteps = len(date_time_index)
+    parameters = region_parameters(regions, parameters)
+
+    energysystem = solph.EnergySystem(timeindex=date_time_index)
+    energysystem.region_parameters = parameters
+    energysystem.region_profiles = {}
+
+    frames = load_regions(regions, links, number_timesteps, parameters,
+                          use_cache=use_cache, validate_input=validate_input)
+
+    buses = {}
+    for region, data in frames.items():
+        suffix = '_' + region
+        profiles = HSNR.create_region(data, date_time_index,
+                                      parameters[region], presolve=presolve,
+                                      suffix=suffix)
+        if presolve:
+            energysystem.region_profiles[region] = profiles
+        buses[region] = energysystem.groups['electricity' + suffix]
+
+    efficiencies = _efficiencies(links)
+    for start, end, capacity, efficiency in zip(
+            links['from'], links['to'], links['capacity'], efficiencies):
+        for source, target in [(start, end), (end, start)]:
+            solph.LinearTransformer(
+                label='transmission_{0}_{1}'.format(source, target),
+                inputs={buses[source]: solph.Flow(nominal_value=capacity)},
+                outputs={buses[target]: solph.Flow()},
+                conversion_factors={buses[target]: efficiency})
+
+    logging.info('Created {0} regions with {1} interconnectors'.format(
+        len(buses), len(links)))
+    return energysystem
+
+
+def optimise_multiregion(regions, links, solvername='cbc',
+                         number_timesteps=8760, parameters=None,
+                         presolve=False, use_cache=True, tee_switch=False,
+                         cmdline_options=None, report=None):
+    import oemof.solph as solph
+
+    date_time_index = pd.date_range('1/1/2012', periods=number_timesteps,
+                                    freq='H')
+    with phase(report, 'create_objects'):
+        energysystem = create_multiregion(
+            regions, links, date_time_index, parameters=parameters,
+            presolve=presolve, use_cache=use_cache)
+
+    with phase(report, 'build_model'):
+        om = solph.OperationalModel(energysystem)
+    if report is not None:
+        report.model_size(om)
+
+    logging.info('Solve the optimization problem')
+    with phase(report, 'solve'):
+        HSNR.solve_model(om, energysystem, solvername=solvername,
+                         tee_switch=tee_switch,
+                         cmdline_options=cmdline_options)
+    return energysystem
+
+
+def region_flows(energysystem, region):
+    """Flows of the electricity bus of a region like HSNR.bus_flows, labels
+    without the region suffix."""
+    suffix = '_' + region
+    flows = HSNR.bus_flows(energysystem, 'electricity' + suffix)
+    flows.columns = pd.MultiIndex.from_tuples(
+        [(kind, label[:-len(suffix)] if label.endswith(suffix) else label)
+         for kind, label in flows.columns])
+    profiles = energysystem.region_profiles.get(region)
+    if profiles is not None:
+        flows = HSNR.expand_residual_flows(flows, profiles)
+    return flows
+
+
+def region_result_dict(energysystem, region):
+    """get_result_dict of one region (objective of the whole system)."""
+    storage = energysystem.groups['storage_' + region]
+    return HSNR.result_dict(region_flows(energysystem, region),
+                            energysystem.results[storage][storage].invest,
+                            energysystem.results.objective)
+
+
+def transmission_flows(energysystem):
+    """Hourly delivered power of all interconnector directions."""
+    flows = {}
+    for (source, target) in energysystem.flows():
+        if str(source.label).startswith('transmission_'):
+            flows[source.label] = energysystem.results[source][target]
+    return pd.DataFrame(flows, index=energysystem.timeindex)
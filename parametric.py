@@ -0,0 +1,173 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Build-once, re-solve-many variant of optimise_storage_size for capacity
+studies.
+
+The EnergySystem and the OperationalModel are built once. The nominal values
+of the fixed sources, the demand scale, the storage ep_costs (capex, lifetime,
+wacc) and the gas limit (summed_max) are changed in place on the Pyomo model
+afterwards and the model is solved again, with a warm start from the previous
+solution if the solver supports it.
+
+Usage:
+
+    model = ParametricModel(solvername='cbc')
+    for capacity in [1, 2, 3]:
+        model.update(solar=capacity, storage_capex=800)
+        energysystem = model.solve()
+        print(HSNR.get_result_dict(energysystem)['storage_cap'])
+
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+from pyomo.opt import SolverFactory
+import oemof.solph as solph
+
+import HSNR
+
+
+STORAGE_PARAMETERS = ['storage_capex', 'storage_lifetime', 'storage_wacc']
+
+# Parameters that can be changed without rebuilding the model
+MUTABLE_PARAMETERS = (HSNR.FIXED_SOURCES + ['demand_scale', 'gas_summed_max'] +
+                      STORAGE_PARAMETERS)
+
+
+def rebuild_objective(om):
+    """Rebuild the objective of the model from the _objective_expression of
+    all blocks (as solph does on model creation), e.g. after nominal values
+    or costs of the nodes have been changed."""
+    blocks = [block for block in om.component_data_objects(po.Block)
+              if hasattr(block, '_objective_expression')]
+    om.del_component(om.objective)
+    expr = 0
+    for block in blocks:
+        expr += block._objective_expression()
+    om.objective = po.Objective(sense=po.minimize, expr=expr)
+
+
+def fix_flow(om, source, target, values):
+    """Fix the flow from source to target to the given values."""
+    for t, value in zip(om.TIMESTEPS, values):
+        om.flow[source, target, t].fix(float(value))
+
+
+def set_upper_bound(constraint, upper):
+    """Replace the (constant) right hand side of a '<=' constraint."""
+    constraint.set_value((None, constraint.body, upper))
+
+
+class ParametricModel(object):
+    """OperationalModel of the HSNR system that is built once and can be
+    re-solved for changed parameters (see MUTABLE_PARAMETERS)."""
+
+    def __init__(self, filename="HSNR.csv", solvername='cbc',
+                 number_timesteps=8760, tee_switch=False, use_cache=True,
+                 presolve=False, parameters=None):
+        self.solvername = solvername
+        self.tee_switch = tee_switch
+        self.presolve = presolve
+        self.parameters = HSNR.get_parameters(parameters)
+        self.date_time_index = pd.date_range('1/1/2012',
+                                             periods=number_timesteps,
+                                             freq='H')
+        self.data = HSNR.load_data(filename, use_cache=use_cache)
+
+        logging.info('Build the parametric model')
+        self.energysystem = HSNR.create_energysystem(
+            self.data, self.date_time_index, parameters=self.parameters,
+            presolve=presolve)
+        self.om = solph.OperationalModel(self.energysystem)
+        self.solved = False
+
+    def update(self, **parameters):
+        """Change parameters of the built model in place."""
+        HSNR.get_parameters(parameters)
+        changed = {name: value for name, value in parameters.items()
+                   if self.parameters[name] != value}
+        rebuild = sorted(set(changed) - set(MUTABLE_PARAMETERS))
+        if rebuild:
+            raise ValueError('Parameters {0} require a new model.'.format(
+                rebuild))
+        if not changed:
+            return
+        self.parameters.update(changed)
+
+        fixed = [name for name in changed
+                 if name in HSNR.FIXED_SOURCES or name == 'demand_scale']
+        if fixed:
+            self._update_fixed_flows(fixed)
+
+        if 'gas_summed_max' in changed:
+            self._update_gas_limit()
+
+        if set(changed) & set(STORAGE_PARAMETERS):
+            storage = self.energysystem.groups['storage']
+            storage.investment.ep_costs = HSNR.storage_ep_costs(
+                self.parameters)
+
+        # fixed costs (nominal values) and ep_costs enter the objective
+        rebuild_objective(self.om)
+
+    def _update_fixed_flows(self, names):
+        om = self.om
+        groups = self.energysystem.groups
+        bel = groups['electricity']
+        number_timesteps = len(self.date_time_index)
+
+        if self.presolve:
+            profiles = HSNR.fixed_profiles(self.data, self.date_time_index,
+                                           self.parameters)
+            self.energysystem.fixed_profiles = profiles
+            residual = (profiles['demand'] -
+                        profiles[HSNR.FIXED_SOURCES].sum(axis=1)).to_numpy()
+            supply = groups['residual_supply']
+            fix_flow(om, bel, groups['residual_demand'],
+                     np.maximum(residual, 0))
+            fix_flow(om, supply, bel, np.maximum(-residual, 0))
+            om.flows[supply, bel].fixed_costs = (
+                self.parameters['fixed_costs'] *
+                sum(self.parameters[label] for label in HSNR.FIXED_SOURCES))
+            return
+
+        for name in names:
+            if name == 'demand_scale':
+                source, target, column = bel, groups['demand'], 'demand_el'
+            else:
+                source, target, column = groups[name], bel, name
+            nominal_value = self.parameters[name]
+            om.flows[source, target].nominal_value = nominal_value
+            fix_flow(om, source, target,
+                     self.data[column].to_numpy()[:number_timesteps] *
+                     nominal_value)
+
+    def _update_gas_limit(self):
+        groups = self.energysystem.groups
+        rgas, bgas = groups['rgas'], groups['natural_gas']
+        flow = self.om.flows[rgas, bgas]
+        flow.summed_max = self.parameters['gas_summed_max']
+        set_upper_bound(self.om.Flow.summed_max[rgas, bgas],
+                        flow.summed_max * flow.nominal_value)
+
+    def solve(self):
+        """Solve the model (warm start from the last solution) and return the
+        EnergySystem with the results."""
+        solve_kwargs = {}
+        if (self.solved and not HSNR.is_direct_solver(self.solvername) and
+                SolverFactory(self.solvername).warm_start_capable()):
+            solve_kwargs['warmstart'] = True
+        logging.info('Solve the optimization problem')
+        HSNR.solve_model(self.om, self.energysystem,
+                         solvername=self.solvername,
+                         tee_switch=self.tee_switch,
+                         solve_kwargs=solve_kwargs)
+        self.solved = True
+        return self.energysystem
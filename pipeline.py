@@ -0,0 +1,157 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Pipelined batch execution of scenarios: model building, solving and result
+extraction overlap.
+
+Building the Pyomo model is CPU-bound Python, while the solver (cbc, glpk,
+...) runs as a separate process and the Python thread only waits for it. A
+builder thread therefore builds scenario N+1 and an extractor thread
+evaluates scenario N-1 while the solver thread waits for scenario N. The
+stages are connected by bounded queues, so at most `queue_size` built and
+`queue_size` solved models are held in memory at any time.
+
+Only the builder thread creates EnergySystems (oemof registers new nodes in
+the most recently created EnergySystem) and only one thread solves (Pyomo
+shell solvers share one stack of temporary files). For parallel solves use
+sweep.run_sweep (processes).
+
+Usage:
+
+    table = run_pipeline(sweep.grid(solar=[1, 2, 4]), queue_size=2)
+
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import HSNR
+import cache
+import validate
+from scenarios import iter_scenarios
+
+
+# Marks the end of the scenarios in a queue
+_DONE = object()
+
+
+class _Job(object):
+
+    def __init__(self, number, scenario):
+        self.number = number
+        self.scenario = scenario
+        self.energysystem = None
+        self.om = None
+        self.error = None
+        self.times = {}
+
+
+def _build(job, data, date_time_index, presolve):
+    import oemof.solph as solph
+
+    job.energysystem = HSNR.create_energysystem(
+        data, date_time_index, parameters=job.scenario, presolve=presolve)
+    job.om = solph.OperationalModel(job.energysystem)
+
+
+def _validate(job, data, number_timesteps):
+    validate.validate(data, number_timesteps, job.scenario)
+
+
+def _timed(job, stage, function, *args):
+    """Run a stage of a job unless an earlier stage failed."""
+    if job.error is not None:
+        return
+    started = time.perf_counter()
+    try:
+        function(job, *args)
+    except Exception as e:
+        logging.exception('Scenario {0} failed in {1}'.format(
+            job.scenario, stage))
+        job.error = repr(e)
+    job.times[stage] = time.perf_counter() - started
+
+
+def run_pipeline(scenarios, filename="HSNR.csv", solvername='cbc',
+                 number_timesteps=8760, presolve=False, threads=None,
+                 time_limit=None, queue_size=2, validate_input=True,
+                 dtype=np.float64):
+    """Solve all scenarios (parameter dictionaries, see sweep.grid, or a
+    scenario matrix, see scenarios.py) with overlapping build, solve and
+    extraction; returns the result table like sweep.run_sweep plus the time
+    of each stage. Scenarios with invalid input get an 'error' like failed
+    runs."""
+    scenarios = list(iter_scenarios(scenarios))
+    date_time_index = pd.date_range('1/1/2012', periods=number_timesteps,
+                                    freq='H')
+    data = HSNR.load_data(filename, fill_missing=None, dtype=dtype,
+                          columns=[HSNR.TIMESTEP_COLUMN] + HSNR.DATA_COLUMNS
+                          if validate_input else None)
+    filled = cache.fill_frame(data[HSNR.DATA_COLUMNS], 0.0)
+    cmdline_options = HSNR.solver_options(solvername, threads, time_limit)
+
+    built = queue.Queue(maxsize=queue_size)
+    solved = queue.Queue(maxsize=queue_size)
+    rows = [None] * len(scenarios)
+
+    def builder():
+        for number, scenario in enumerate(scenarios):
+            job = _Job(number, scenario)
+            if validate_input:
+                _timed(job, 'validate', _validate, data, number_timesteps)
+            _timed(job, 'build', _build, filled, date_time_index, presolve)
+            built.put(job)
+        built.put(_DONE)
+
+    def solver():
+        while True:
+            job = built.get()
+            if job is _DONE:
+                solved.put(_DONE)
+                return
+            _timed(job, 'solve', lambda job: HSNR.solve_model(
+                job.om, job.energysystem, solvername=solvername,
+                cmdline_options=cmdline_options))
+            job.om = None
+            solved.put(job)
+
+    def extractor():
+        while True:
+            job = solved.get()
+            if job is _DONE:
+                return
+            row = dict(job.scenario)
+            _timed(job, 'extract', lambda job: row.update(
+                HSNR.get_result_dict(job.energysystem)))
+            if job.error is not None:
+                row['error'] = job.error
+            row.update(('{0}_time'.format(stage), duration)
+                       for stage, duration in job.times.items())
+            rows[job.number] = row
+            job.energysystem = None
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=builder, name='build'),
+               threading.Thread(target=solver, name='solve'),
+               threading.Thread(target=extractor, name='extract')]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    table = pd.DataFrame(rows)
+    table.index.name = 'scenario'
+    stages = sum(table[c].sum() for c in table.columns
+                 if c.endswith('_time'))
+    logging.info('{0} scenarios in {1:.1f} s ({2:.1f} s of stage time)'
+                 .format(len(scenarios), time.perf_counter() - started,
+                         stages))
+    return table
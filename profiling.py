@@ -0,0 +1,120 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Phase-level instrumentation of the HSNR pipeline.
+
+A RunReport records wall time, CPU time and peak RSS for every phase (csv
+loading, object creation, model construction, lp dump, solve, result
+extraction, plots) and the size of the optimisation model (variables,
+constraints and, with RunReport(nonzeros=True), nonzeros). It is written as
+one JSON document per run.
+
+Usage:
+
+    report = RunReport(nonzeros=True)
+    energysystem = optimise_storage_size(report=report)
+    with report.phase('get_result_dict'):
+        get_result_dict(energysystem)
+    report.write('report.json')
+
+"""
+
+import contextlib
+import datetime
+import json
+import platform
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """Return the peak resident set size [MB] of this process and of its
+    finished child processes (e.g. the solver), None if not available."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    unit = 1024 ** 2 if platform.system() == 'Darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit)
+
+
+class RunReport(object):
+    """Collects phase timings and model size of one run (with nonzeros:
+    including the nonzeros of the constraint matrix)."""
+
+    def __init__(self, name='HSNR', nonzeros=False, **info):
+        self.name = name
+        self.nonzeros = nonzeros
+        self.info = info
+        self.phases = []
+        self.model = {}
+        self.started = datetime.datetime.now().isoformat()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            rss, rss_children = peak_rss()
+            self.phases.append({
+                'phase': name,
+                'wall_time': time.perf_counter() - wall,
+                'cpu_time': time.process_time() - cpu,
+                'peak_rss_mb': rss,
+                'peak_rss_children_mb': rss_children})
+
+    def model_size(self, om, nonzeros=None):
+        """Record number of variables and constraints of a Pyomo model (and
+        the nonzeros of the constraint matrix, which needs a pass over all
+        constraints, timed as phase 'count_nonzeros'; default: the nonzeros
+        setting of the report)."""
+        self.model['variables'] = om.nvariables()
+        self.model['constraints'] = om.nconstraints()
+        if self.nonzeros if nonzeros is None else nonzeros:
+            with self.phase('count_nonzeros'):
+                self.model['nonzeros'] = count_nonzeros(om)
+
+    def to_dict(self):
+        return {'name': self.name,
+                'started': self.started,
+                'info': self.info,
+                'model': self.model,
+                'phases': self.phases,
+                'total_wall_time': sum(p['wall_time'] for p in self.phases)}
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+
+def count_nonzeros(om):
+    """Count the nonzeros of the constraint matrix of a Pyomo model."""
+    import pyomo.environ as po
+    from pyomo.repn import generate_standard_repn
+
+    nonzeros = 0
+    for constraint in om.component_data_objects(po.Constraint, active=True):
+        repn = generate_standard_repn(constraint.body, compute_values=False)
+        nonzeros += len(repn.linear_vars) + len(repn.quadratic_vars)
+    return nonzeros
+
+
+@contextlib.contextmanager
+def _no_phase():
+    yield
+
+
+def phase(report, name):
+    """report.phase(name) or a no-op if report is None."""
+    if report is None:
+        return _no_phase()
+    return report.phase(name)
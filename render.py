@@ -0,0 +1,224 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Headless batch rendering of the result plots of create_plots.
+
+The three figures of create_plots (inputs of the electricity bus in January,
+outputs over the whole year, io plot of June) are written to files with the
+Agg backend, without a display and without a live EnergySystem. The hourly
+flows are read from the result store (store.ResultStore) or from snapshots
+(snapshot.save). Long time ranges are decimated to minimum and maximum per
+bucket, so peaks stay visible with a fraction of the points. Many scenarios
+are rendered in parallel in a process pool.
+
+Usage:
+
+    render_many(['snapshots/base', '3f9c...'], 'figures', processes=8)
+    python render.py snapshots/base 3f9c... --directory figures
+
+"""
+
+import argparse
+import functools
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.dates as mdates
+import matplotlib.style
+
+import snapshot
+import store
+
+
+MAX_POINTS = 2000
+
+
+def decimate(frame, max_points=MAX_POINTS):
+    """Reduce a time series frame to about max_points rows.
+
+    The rows are cut into buckets and for every column the minimum and the
+    maximum of each bucket are kept (in the order they occur). Frames with
+    at most max_points rows are returned unchanged.
+    """
+    if len(frame) <= max_points:
+        return frame
+    size = int(np.ceil(2 * len(frame) / max_points))
+    buckets = len(frame) // size
+    values = frame.to_numpy()[:buckets * size].reshape(buckets, size, -1)
+
+    first_min = values.argmin(axis=1) <= values.argmax(axis=1)
+    minimum = values.min(axis=1)
+    maximum = values.max(axis=1)
+    decimated = np.empty((2 * buckets, values.shape[2]))
+    decimated[0::2] = np.where(first_min, minimum, maximum)
+    decimated[1::2] = np.where(first_min, maximum, minimum)
+
+    # bucket start and middle as time stamps of the two points
+    index = np.empty(2 * buckets, dtype=frame.index.dtype)
+    index[0::2] = frame.index[:buckets * size:size]
+    index[1::2] = frame.index[size // 2:buckets * size:size]
+    return pd.concat([pd.DataFrame(decimated, index=pd.DatetimeIndex(index),
+                                   columns=frame.columns),
+                      frame.iloc[buckets * size:]])
+
+
+def load_flows(source, store_path=None):
+    """Flows of the electricity bus (see HSNR.bus_flows) of a snapshot
+    directory or of a key of the result store."""
+    if os.path.isfile(os.path.join(source, snapshot.META_FILENAME)):
+        return snapshot.load(source).bus_flows()
+    return store.ResultStore(store_path).flows(source)
+
+
+def _ordered(columns, order):
+    return ([c for c in order if c in columns] +
+            [c for c in columns if c not in order])
+
+
+def _figure(figsize):
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot(1, 1, 1)
+
+
+def _finish(ax, title, date_format=None, interval=None):
+    ax.set_title(title)
+    ax.set_ylabel('Power in MW')
+    ax.set_xlabel('Date')
+    if date_format is not None:
+        ax.xaxis.set_major_locator(mdates.DayLocator(interval=interval))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+        ax.figure.autofmt_xdate()
+
+
+def plot_lines(ax, flows, colors=None, max_points=MAX_POINTS, **kwargs):
+    """Line plot of all columns of flows (decimated)."""
+    flows = decimate(flows, max_points)
+    for number, label in enumerate(flows.columns):
+        ax.plot(flows.index, flows[label].to_numpy(), label=label,
+                color=None if colors is None else colors[number], **kwargs)
+    ax.legend(loc='upper right')
+
+
+def io_plot(flows, ax, colors, barorder, lineorder):
+    """Stacked inputs and output lines of the bus, like
+    outputlib.DataFramePlot.io_plot."""
+    inputs = flows['to_bus']
+    outputs = flows['from_bus']
+    bars = _ordered(list(inputs.columns), barorder)
+    lines = _ordered(list(outputs.columns), lineorder)
+    ax.stackplot(inputs.index, inputs[bars].to_numpy().T, step='post',
+                 labels=bars, colors=[colors.get(label, '#cccccc')
+                                      for label in bars])
+    for label in lines:
+        ax.step(outputs.index, outputs[label].to_numpy(), where='post',
+                label=label, color=colors.get(label), linewidth=4)
+    handles, labels = ax.get_legend_handles_labels()
+    return handles, labels
+
+
+def render_figures(flows, directory, name, max_points=MAX_POINTS,
+                   fmt='png', dpi=100):
+    """Write the January, year and June figures of create_plots for the
+    flows of the electricity bus; returns the file names."""
+    import HSNR
+
+    os.makedirs(directory, exist_ok=True)
+    year = flows.index[0].year
+    filenames = []
+
+    # input flows of the electricity bus for January
+    january = flows['to_bus'].loc['{0}-01-01'.format(year):
+                                  '{0}-01-31 00:00:00'.format(year)]
+    figure, ax = _figure((16, 9))
+    plot_lines(ax, january,
+               colors=[HSNR.COLORS.get(label) for label in january.columns],
+               max_points=max_points, linewidth=2)
+    _finish(ax, 'January {0}'.format(year), '%d-%m-%Y', 7)
+    filenames.append(os.path.join(directory, '{0}_january.{1}'.format(
+        name, fmt)))
+    figure.savefig(filenames[-1], dpi=dpi)
+
+    # output flows of the electricity bus for the whole year
+    outputs = flows['from_bus']
+    figure, ax = _figure((16, 9))
+    plot_lines(ax, outputs,
+               colors=matplotlib.cm.Spectral(
+                   np.linspace(0, 1, len(outputs.columns))),
+               max_points=max_points, linewidth=2)
+    _finish(ax, 'Year {0}'.format(year))
+    filenames.append(os.path.join(directory, '{0}_year.{1}'.format(
+        name, fmt)))
+    figure.savefig(filenames[-1], dpi=dpi)
+
+    # combined stacked plot for June
+    june = flows.loc['{0}-06-01'.format(year):
+                     '{0}-06-28 00:00:00'.format(year)]
+    with matplotlib.rc_context({'font.size': 19, 'legend.fontsize': 19}):
+        with matplotlib.style.context('grayscale'):
+            figure, ax = _figure((24, 14))
+            handles, labels = io_plot(june, ax, HSNR.COLORS, HSNR.BAR_ORDER,
+                                      HSNR.LINE_ORDER)
+            _finish(ax, 'Electricity bus', '%d-%m-%Y', 1)
+            ax.legend(handles, labels, loc='center left',
+                      bbox_to_anchor=(1, 0.5))
+            figure.subplots_adjust(right=0.8)
+            filenames.append(os.path.join(directory, '{0}_june.{1}'.format(
+                name, fmt)))
+            figure.savefig(filenames[-1], dpi=dpi)
+    return filenames
+
+
+def render_source(source, directory='figures', store_path=None, **kwargs):
+    """Render the figures of one snapshot directory or store key."""
+    name = os.path.basename(os.path.normpath(source))
+    try:
+        return render_figures(load_flows(source, store_path), directory,
+                              name, **kwargs)
+    except Exception:
+        logging.exception('Rendering of {0} failed'.format(source))
+        return []
+
+
+def render_many(sources, directory='figures', processes=None,
+                store_path=None, **kwargs):
+    """Render the figures of all sources in a process pool; returns the
+    file names per source."""
+    sources = list(sources)
+    processes = processes or os.cpu_count()
+    logging.info('Render {0} results on {1} processes'.format(
+        len(sources), processes))
+    worker = functools.partial(render_source, directory=directory,
+                               store_path=store_path, **kwargs)
+    with multiprocessing.Pool(processes) as pool:
+        filenames = pool.map(worker, sources, chunksize=1)
+    return dict(zip(sources, filenames))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description='Render the HSNR result plots to files')
+    parser.add_argument('sources', nargs='+',
+                        help='snapshot directories or result store keys')
+    parser.add_argument('--directory', default='figures')
+    parser.add_argument('--store', default=None,
+                        help='result store path (default: results)')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS)
+    parser.add_argument('--format', default='png')
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    render_many(args.sources, args.directory, args.processes,
+                store_path=args.store, max_points=args.max_points,
+                fmt=args.format, dpi=args.dpi)
@@ -0,0 +1,201 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Rolling-horizon (temporal decomposition) mode of optimise_storage_size for
+multi-year horizons.
+
+The horizon (one or several concatenated weather years) is solved in
+overlapping windows one after another. Only the first window - overlap
+time steps of each window are committed; the state of charge of the
+storage at the end of the committed part is the initial state of charge of
+the next window. Peak memory is therefore bounded by the window size.
+
+The storage investment is found by a fixed-point iteration: every window may
+increase the storage capacity (its ep_costs are scaled to the window length)
+and the largest capacity of a pass is the lower bound of the next pass,
+until the capacity does not change any more.
+
+Usage:
+
+    result = optimise_rolling(['HSNR_2015.csv', 'HSNR_2016.csv'],
+                              window=720, overlap=168)
+    print(result.storage_cap, result.objective)
+
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+import oemof.solph as solph
+
+import HSNR
+
+
+class RollingResult(object):
+    """Result of optimise_rolling: storage capacity, objective recalculated
+    for the whole horizon, committed hourly flows of the electricity bus
+    (columns (type, label) with type 'to_bus'/'from_bus'), state of charge
+    and number of fixed-point iterations."""
+
+    def __init__(self, storage_cap, objective, flows, soc, iterations):
+        self.storage_cap = storage_cap
+        self.objective = objective
+        self.flows = flows
+        self.soc = soc
+        self.iterations = iterations
+
+
+def load_horizon(filenames, use_cache=True):
+    """Concatenate one or several time series files to one horizon."""
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    return pd.concat([HSNR.load_data(f, use_cache=use_cache)
+                      for f in filenames], ignore_index=True)
+
+
+def set_initial_soc(om, storage, soc, keep_final=False):
+    """Start the storage with the state of charge soc instead of the cyclic
+    condition of solph (unless keep_final, the final state is free)."""
+    block = om.InvestmentStorage
+    bus_in = list(storage.inputs)[0]
+    bus_out = list(storage.outputs)[0]
+    first = om.TIMESTEPS.first()
+
+    if (not keep_final and hasattr(block, 'initial_capacity') and
+            storage in block.initial_capacity):
+        block.initial_capacity[storage].deactivate()
+    block.balance[storage, first].deactivate()
+    om.initial_soc = po.Param(initialize=soc, mutable=True)
+    om.initial_balance = po.Constraint(
+        expr=block.capacity[storage, first] ==
+        om.initial_soc * (1 - storage.capacity_loss[first]) +
+        om.flow[bus_in, storage, first] *
+        storage.inflow_conversion_factor[first] -
+        om.flow[storage, bus_out, first] /
+        storage.outflow_conversion_factor[first])
+
+
+def bus_flow_values(om, bus, steps):
+    """Return the flows into ('to_bus') and out of ('from_bus') the bus for
+    the first steps time steps as DataFrame."""
+    timesteps = list(om.TIMESTEPS)[:steps]
+    columns = {}
+    for (source, target) in om.flows:
+        if target is bus:
+            key = ('to_bus', source.label)
+        elif source is bus:
+            key = ('from_bus', target.label)
+        else:
+            continue
+        columns[key] = np.array([om.flow[source, target, t].value
+                                 for t in timesteps], dtype=float)
+    return pd.DataFrame(columns)
+
+
+def _solve_window(data, date_time_index, parameters, capacity, soc, last,
+                  solvername, tee_switch, presolve):
+    energysystem = HSNR.create_energysystem(data, date_time_index,
+                                            parameters=parameters,
+                                            presolve=presolve)
+    storage = energysystem.groups['storage']
+    storage.investment.ep_costs = (HSNR.storage_ep_costs(parameters) *
+                                   len(date_time_index) / 8760)
+
+    om = solph.OperationalModel(energysystem)
+    om.InvestmentStorage.invest[storage].setlb(capacity)
+    set_initial_soc(om, storage, soc, keep_final=last)
+    HSNR.solve_model(om, energysystem, solvername=solvername,
+                     tee_switch=tee_switch)
+    return energysystem, om
+
+
+def _solve_pass(data, date_time_index, window, overlap, parameters, capacity,
+                solvername, tee_switch, presolve):
+    number_timesteps = len(date_time_index)
+    step = window - overlap
+    soc = 0.0
+    largest = capacity
+    flows, socs = [], []
+
+    for start in range(0, number_timesteps, step):
+        end = min(start + window, number_timesteps)
+        last = end == number_timesteps
+        commit = end - start if last else step
+        logging.info('Solve window {0} - {1}'.format(start, end))
+
+        energysystem, om = _solve_window(
+            data.iloc[start:end].reset_index(drop=True),
+            date_time_index[start:end], parameters, capacity, soc, last,
+            solvername, tee_switch, presolve)
+        storage = energysystem.groups['storage']
+        bel = energysystem.groups['electricity']
+
+        capacity_values = [om.InvestmentStorage.capacity[storage, t].value
+                           for t in list(om.TIMESTEPS)[:commit]]
+        flows.append(bus_flow_values(om, bel, commit))
+        socs.append(np.array(capacity_values, dtype=float))
+        soc = capacity_values[-1]
+        largest = max(largest, om.InvestmentStorage.invest[storage].value)
+        del energysystem, om
+        if last:
+            break
+
+    flows = pd.concat(flows, ignore_index=True).fillna(0)
+    flows.index = date_time_index
+    soc = pd.Series(np.concatenate(socs), index=date_time_index)
+    return largest, flows, soc
+
+
+def horizon_objective(flows, storage_cap, parameters, number_timesteps):
+    """Objective of the whole horizon from the committed flows: variable
+    costs plus annual fixed and storage investment costs per year."""
+    years = number_timesteps / 8760
+    variable_costs = (
+        flows['to_bus', 'pp_gas'].sum() *
+        parameters['pp_gas_variable_costs'] +
+        (flows['to_bus', 'storage'].sum() + flows['from_bus', 'storage'].sum())
+        * parameters['storage_variable_costs'])
+    fixed_costs = parameters['fixed_costs'] * sum(
+        parameters[label] for label in HSNR.FIXED_SOURCES)
+    return (variable_costs + years *
+            (fixed_costs + HSNR.storage_ep_costs(parameters) * storage_cap))
+
+
+def optimise_rolling(filename="HSNR.csv", window=720, overlap=168,
+                     solvername='cbc', number_timesteps=None,
+                     start='1/1/2012', parameters=None, presolve=False,
+                     max_iterations=10, tolerance=1e-3, tee_switch=False):
+    """Solve the horizon of one or several time series files in
+    overlapping windows (see module docstring)."""
+    if not 0 <= overlap < window:
+        raise ValueError('overlap must be smaller than window.')
+    parameters = HSNR.get_parameters(parameters)
+    data = load_horizon(filename)
+    number_timesteps = number_timesteps or len(data)
+    date_time_index = pd.date_range(start, periods=number_timesteps,
+                                    freq='H')
+
+    capacity = 0.0
+    for iteration in range(1, max_iterations + 1):
+        new_capacity, flows, soc = _solve_pass(
+            data, date_time_index, window, overlap, parameters, capacity,
+            solvername, tee_switch, presolve)
+        logging.info('Iteration {0}: storage capacity {1}'.format(
+            iteration, new_capacity))
+        converged = abs(new_capacity - capacity) <= tolerance * max(
+            abs(new_capacity), 1)
+        capacity = new_capacity
+        if converged:
+            break
+    else:
+        logging.warning('Storage capacity did not converge after {0} '
+                        'iterations.'.format(max_iterations))
+
+    objective = horizon_objective(flows, capacity, parameters,
+                                  number_timesteps)
+    return RollingResult(capacity, objective, flows, soc, iteration)
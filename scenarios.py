@@ -0,0 +1,169 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Scenario matrix: many parameter sets (values.py-style) in one columnar file.
+
+The matrix is a numpy structured array of shape () with one field per
+parameter (a subset of HSNR.PARAMETERS, e.g. solar, demand_scale,
+storage_capex, gas_summed_max). Each field is a contiguous float64 column
+with one value per scenario, so matrix['solar'] is a column, not a strided
+view. Parameters that are not a field keep their defaults of values.py. The
+matrix is stored as .npy file and memory-mapped on load. A scenario reads
+one value from each column, and loading thousands of scenarios takes
+milliseconds instead of an import per scenario.
+
+The schema (known parameter names, finite and non-negative values, positive
+storage_lifetime) is checked vectorized before any run starts.
+
+The runners (sweep.run_sweep, pipeline.run_pipeline, workqueue.create)
+accept a matrix or the name of its file instead of a list of scenario
+dictionaries.
+
+Usage:
+
+    matrix = design(solar=[1, 2, 4],
+                    storage_capex=np.linspace(500, 1500, 11))
+    save('design.npy', matrix)
+    table = sweep.run_sweep('design.npy', processes=32)
+    parameters(load('design.npy'), 7)      # {'solar': 2.0, ...}
+
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def dtype(names, number):
+    """Structured dtype of a matrix of `number` scenarios with the given
+    parameters (one float64 column each)."""
+    return np.dtype([(name, np.float64, (number,)) for name in names])
+
+
+def size(matrix):
+    """Number of scenarios of a matrix."""
+    names = matrix.dtype.names
+    return matrix.dtype[names[0]].shape[0] if names else 0
+
+
+def check(matrix):
+    """Return the list of schema errors of a scenario matrix."""
+    import HSNR
+
+    names = matrix.dtype.names
+    if (not names or matrix.shape != () or
+            len(set(matrix.dtype[n].shape for n in names)) != 1 or
+            len(matrix.dtype[names[0]].shape) != 1):
+        return ['Not a scenario matrix (structured array of shape () with '
+                'one column of equal length per parameter).']
+    errors = []
+    unknown = sorted(set(names) - set(HSNR.PARAMETERS))
+    if unknown:
+        errors.append('Unknown parameters {0}.'.format(unknown))
+    for name in names:
+        if not np.issubdtype(matrix.dtype[name].base, np.number):
+            errors.append('{0}: {1} is not numeric.'.format(
+                name, matrix.dtype[name].base))
+            continue
+        values = matrix[name]
+        invalid = np.flatnonzero(~np.isfinite(values) | (values < 0) |
+                                 ((values <= 0) if name == 'storage_lifetime'
+                                  else False))
+        if len(invalid):
+            errors.append('{0}: {1} invalid values, first in scenario '
+                          '{2}.'.format(name, len(invalid), invalid[0]))
+    return errors
+
+
+def validate(matrix):
+    """Raise a validate.ValidationError if the matrix has schema errors;
+    returns the matrix."""
+    from validate import ValidationError
+
+    errors = check(matrix)
+    if errors:
+        raise ValidationError(errors)
+    return matrix
+
+
+def design(**axes):
+    """Full factorial design of the given parameter values (like
+    sweep.grid) as scenario matrix."""
+    names = list(axes)
+    matrix = np.zeros((), dtype=dtype(
+        names, int(np.prod([len(axes[n]) for n in names]))))
+    grids = np.meshgrid(*(np.asarray(axes[n], dtype=float) for n in names),
+                        indexing='ij')
+    for name, values in zip(names, grids):
+        matrix[name] = values.ravel()
+    return validate(matrix)
+
+
+def from_frame(frame):
+    """Scenario matrix of a DataFrame (or csv file) with one column per
+    parameter and one row per scenario. Unknown parameters and values that
+    are not numbers raise a validate.ValidationError like schema errors."""
+    import HSNR
+    from validate import ValidationError
+
+    if isinstance(frame, str):
+        frame = pd.read_csv(frame)
+    errors = []
+    unknown = sorted(set(frame.columns) - set(HSNR.PARAMETERS))
+    if unknown:
+        errors.append('Unknown parameters {0}.'.format(unknown))
+    columns = {}
+    for name in frame.columns:
+        columns[name] = pd.to_numeric(frame[name], errors='coerce')
+        invalid = np.flatnonzero(columns[name].isna().to_numpy() &
+                                 frame[name].notna().to_numpy())
+        if len(invalid):
+            errors.append('{0}: {1} values are not numbers, first in '
+                          'scenario {2}.'.format(name, len(invalid),
+                                                 invalid[0]))
+    if errors:
+        raise ValidationError(errors)
+
+    matrix = np.zeros((), dtype=dtype(frame.columns, len(frame)))
+    for name in frame.columns:
+        matrix[name] = columns[name].to_numpy(dtype=float)
+    return validate(matrix)
+
+
+def save(path, matrix):
+    """Check the matrix and write it to the .npy file path (atomically)."""
+    validate(matrix)
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.npy',
+                                     delete=False) as f:
+        np.save(f, matrix)
+    os.replace(f.name, path)
+
+
+def load(path, mmap=True):
+    """Load and check a scenario matrix (memory-mapped, read only)."""
+    return validate(np.load(path, mmap_mode='r' if mmap else None))
+
+
+def parameters(matrix, number):
+    """Parameter dictionary of scenario `number` (for get_parameters)."""
+    return {name: float(matrix[name][number])
+            for name in matrix.dtype.names}
+
+
+def iter_scenarios(scenarios):
+    """Scenario dictionaries of a matrix, a matrix file or (unchanged) an
+    iterable of dictionaries."""
+    if isinstance(scenarios, str):
+        scenarios = load(scenarios)
+    elif isinstance(scenarios, np.ndarray):
+        validate(scenarios)
+    else:
+        return scenarios
+    return (parameters(scenarios, number)
+            for number in range(size(scenarios)))
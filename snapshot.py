@@ -0,0 +1,153 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Compact binary snapshot of a solved EnergySystem.
+
+Instead of pickling the whole oemof/Pyomo object graph (esys.dump()) only
+what get_result_dict and the plots need is stored in a directory:
+
+ * flows.npy: all hourly flows as one contiguous float64 array (time steps
+   x flows), memory-mapped on load,
+ * profiles.npy: the fixed profiles of a presolved system (if any),
+ * snapshot.json: node labels and types, the (source, target) labels of the
+   flows (bus topology), the time index, storage investment and objective.
+
+Loading a snapshot takes milliseconds and never requires a re-solve.
+
+Usage:
+
+    save(energysystem, 'snapshots/base')
+    snap = load('snapshots/base')
+    snap.bus_flows('electricity')
+    HSNR.get_result_dict(snap)
+
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+SNAPSHOT_VERSION = 1
+META_FILENAME = 'snapshot.json'
+FLOWS_FILENAME = 'flows.npy'
+PROFILES_FILENAME = 'profiles.npy'
+
+
+class Snapshot(object):
+    """Solved system loaded by load().
+
+    nodes: type name of each node label, flows: (source, target) label of
+    each column of values, values: flows (time steps x flows), timeindex,
+    storage_cap, objective, fixed_profiles: DataFrame or None.
+    """
+
+    def __init__(self, nodes, flows, values, timeindex, storage_cap,
+                 objective, fixed_profiles=None):
+        self.nodes = nodes
+        self.flows = flows
+        self.values = values
+        self.timeindex = timeindex
+        self.storage_cap = storage_cap
+        self.objective = objective
+        self.fixed_profiles = fixed_profiles
+
+    def flow(self, source, target):
+        """Hourly values of the flow from source to target (labels)."""
+        return self.values[:, self.flows.index((source, target))]
+
+    def bus_flows(self, bus_label='electricity'):
+        """Same DataFrame as HSNR.bus_flows for the live EnergySystem."""
+        keys, columns = [], []
+        for number, (source, target) in enumerate(self.flows):
+            if target == bus_label:
+                keys.append(('to_bus', source))
+            elif source == bus_label:
+                keys.append(('from_bus', target))
+            else:
+                continue
+            columns.append(number)
+
+        frame = pd.DataFrame(self.values[:, columns], index=self.timeindex,
+                             columns=pd.MultiIndex.from_tuples(keys))
+        if self.fixed_profiles is not None and bus_label == 'electricity':
+            import HSNR
+            frame = HSNR.expand_residual_flows(frame, self.fixed_profiles)
+        return frame
+
+
+def save(energysystem, path):
+    """Write the snapshot of a solved EnergySystem to the directory path
+    (replaced if it exists)."""
+    results = energysystem.results
+    storage = energysystem.groups['storage']
+    flows = list(energysystem.flows())
+    values = np.array([results[source][target] for source, target in flows],
+                      dtype=np.float64).T
+    timeindex = energysystem.timeindex[:len(values)]
+
+    meta = {'version': SNAPSHOT_VERSION,
+            'nodes': {node.label: type(node).__name__
+                      for node in energysystem.nodes},
+            'flows': [[source.label, target.label]
+                      for source, target in flows],
+            'timeindex': {'start': timeindex[0].isoformat(),
+                          'periods': len(timeindex),
+                          'freq': timeindex.freqstr or
+                          pd.infer_freq(timeindex)},
+            'storage_cap': float(results[storage][storage].invest),
+            'objective': float(results.objective),
+            'profiles': None}
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    np.save(os.path.join(tmp_path, FLOWS_FILENAME),
+            np.ascontiguousarray(values))
+    profiles = getattr(energysystem, 'fixed_profiles', None)
+    if profiles is not None:
+        meta['profiles'] = list(profiles.columns)
+        np.save(os.path.join(tmp_path, PROFILES_FILENAME),
+                np.ascontiguousarray(profiles.to_numpy(dtype=np.float64)))
+    with open(os.path.join(tmp_path, META_FILENAME), 'w') as f:
+        json.dump(meta, f)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    logging.info('Stored snapshot in {0}.'.format(path))
+
+
+def load(path, mmap=True):
+    """Load a snapshot written by save() (flows memory-mapped if mmap)."""
+    with open(os.path.join(path, META_FILENAME)) as f:
+        meta = json.load(f)
+    if meta['version'] != SNAPSHOT_VERSION:
+        raise ValueError('Snapshot {0} has version {1}, expected {2}.'.format(
+            path, meta['version'], SNAPSHOT_VERSION))
+
+    mmap_mode = 'r' if mmap else None
+    values = np.load(os.path.join(path, FLOWS_FILENAME), mmap_mode=mmap_mode)
+    timeindex = pd.date_range(meta['timeindex']['start'],
+                              periods=meta['timeindex']['periods'],
+                              freq=meta['timeindex']['freq'])
+
+    fixed_profiles = None
+    if meta['profiles'] is not None:
+        fixed_profiles = pd.DataFrame(
+            np.load(os.path.join(path, PROFILES_FILENAME),
+                    mmap_mode=mmap_mode),
+            index=timeindex, columns=meta['profiles'])
+
+    return Snapshot(meta['nodes'],
+                    [tuple(flow) for flow in meta['flows']],
+                    values, timeindex, meta['storage_cap'],
+                    meta['objective'], fixed_profiles)
@@ -0,0 +1,238 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Persistent local store of solved runs.
+
+Every run is keyed by a hash of everything that determines its result: the
+content of the input csv file, all parameters (nominal values of values.py,
+demand scale, gas limit, storage capex/lifetime/wacc, variable and fixed
+costs), the solver, its time limit and the horizon. The store keeps
+
+ * the result values of get_result_dict and the parameters in an SQLite
+   index (index.sqlite, tables runs, parameters and results in long format,
+   so they can be queried with SQL across thousands of runs) and
+ * the hourly flows of the electricity bus as compressed npz file with one
+   array per flow (flows/<key>.npz).
+
+A repeated scenario is served from the store instead of being solved again.
+
+Usage:
+
+    store = ResultStore()
+    result, key, cached = optimise_cached(store, parameters={'solar': 2})
+    store.table()                                  # one row per run
+    store.query('SELECT key FROM results WHERE name = ? AND value > ?',
+                ('storage_cap', 1e5))
+
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import cache
+from profiling import phase
+
+
+# Part of the key, increase when a change of the model changes the results
+STORE_VERSION = 3
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'results')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY, created TEXT, filename TEXT, data_hash TEXT,
+    solver TEXT, number_timesteps INTEGER, presolve INTEGER);
+CREATE TABLE IF NOT EXISTS parameters (
+    key TEXT, name TEXT, value REAL, PRIMARY KEY (key, name));
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT, name TEXT, value REAL, PRIMARY KEY (key, name));
+CREATE INDEX IF NOT EXISTS results_name ON results (name, value);
+"""
+
+
+def scenario_key(data_hash, parameters, solvername, number_timesteps,
+                 presolve=False, time_limit=None, dtype=None):
+    """Hash of all inputs of a run (parameters: complete, see
+    HSNR.get_parameters). A run stopped by a time limit may not be optimal,
+    so the time limit is part of the key, as the dtype of the time series
+    unless it is float64."""
+    description = {'version': STORE_VERSION,
+                   'data': data_hash,
+                   'parameters': parameters,
+                   'solver': solvername,
+                   'number_timesteps': number_timesteps,
+                   'presolve': bool(presolve),
+                   'time_limit': time_limit}
+    if dtype is not None and np.dtype(dtype) != np.float64:
+        description['dtype'] = np.dtype(dtype).name
+    description = json.dumps(description, sort_keys=True, default=float)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+class ResultStore(object):
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('HSNR_RESULT_STORE') or STORE_DIR
+        os.makedirs(os.path.join(self.path, 'flows'), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(os.path.join(self.path, 'index.sqlite'),
+                                     timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _flow_file(self, key):
+        return os.path.join(self.path, 'flows', key + '.npz')
+
+    def __contains__(self, key):
+        with self._connect() as connection:
+            row = connection.execute('SELECT 1 FROM runs WHERE key = ?',
+                                     (key,)).fetchone()
+        return row is not None
+
+    def put(self, key, run, parameters, result, flows=None):
+        """Store a run. run: filename, data_hash, solver, number_timesteps,
+        presolve; result: dict of get_result_dict; flows: see
+        HSNR.bus_flows."""
+        if flows is not None:
+            arrays = {'{0}|{1}'.format(*column): flows[column].to_numpy()
+                      for column in flows.columns}
+            arrays['__index__'] = flows.index.values.astype('datetime64[ns]')
+            tmp_file = self._flow_file(key) + '.tmp.npz'
+            np.savez_compressed(tmp_file, **arrays)
+            os.replace(tmp_file, self._flow_file(key))
+
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, datetime.datetime.now().isoformat(), run['filename'],
+                 run['data_hash'], run['solver'], run['number_timesteps'],
+                 int(run.get('presolve', False))))
+            connection.executemany(
+                'INSERT OR REPLACE INTO parameters VALUES (?, ?, ?)',
+                [(key, name, float(value))
+                 for name, value in parameters.items()])
+            connection.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                [(key, name, float(value)) for name, value in result.items()])
+
+    def get(self, key):
+        """Return the stored result dict of a run."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT name, value FROM results WHERE key = ?',
+                (key,)).fetchall()
+        if not rows:
+            raise KeyError(key)
+        return dict(rows)
+
+    def flows(self, key):
+        """Return the stored hourly flows of a run (columns (type, label))."""
+        with np.load(self._flow_file(key)) as arrays:
+            index = pd.DatetimeIndex(arrays['__index__'])
+            columns = [name for name in arrays.files if name != '__index__']
+            frame = pd.DataFrame({tuple(name.split('|', 1)): arrays[name]
+                                  for name in columns}, index=index)
+        return frame
+
+    def query(self, sql, params=()):
+        """Run an SQL query against the index and return a DataFrame."""
+        with self._connect() as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def table(self):
+        """All runs with their parameters and results, one row per run."""
+        runs = self.query('SELECT * FROM runs').set_index('key')
+        parameters = self.query('SELECT * FROM parameters').pivot(
+            index='key', columns='name', values='value')
+        results = self.query('SELECT * FROM results').pivot(
+            index='key', columns='name', values='value')
+        return runs.join(parameters).join(results)
+
+
+def describe_run(filename="HSNR.csv", solvername='cbc',
+                 number_timesteps=8760, parameters=None, presolve=False,
+                 time_limit=None, dtype=None):
+    """Return key, run description and complete parameters of a run."""
+    import HSNR
+
+    full_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 filename)
+    data_hash = cache.file_hash(full_filename)
+    parameters = HSNR.get_parameters(parameters)
+    key = scenario_key(data_hash, parameters, solvername, number_timesteps,
+                       presolve, time_limit, dtype)
+    run = {'filename': filename, 'data_hash': data_hash,
+           'solver': solvername, 'number_timesteps': number_timesteps,
+           'presolve': presolve, 'time_limit': time_limit}
+    return key, run, parameters
+
+
+def store_energysystem(store, key, run, parameters, energysystem,
+                       duals=False, report=None):
+    """Store the results (with duals: including HSNR.dual_dict) and flows
+    of a solved EnergySystem; returns the result dict. The extraction and
+    the writing are the phases 'get_result_dict' and 'store_results' of
+    the report."""
+    import HSNR
+
+    with phase(report, 'get_result_dict'):
+        flows = HSNR.bus_flows(energysystem)
+        storage = energysystem.groups['storage']
+        result = HSNR.result_dict(
+            flows, energysystem.results[storage][storage].invest,
+            energysystem.results.objective)
+        if duals:
+            result.update(HSNR.dual_dict(energysystem, flows))
+    with phase(report, 'store_results'):
+        store.put(key, run, parameters, result, flows)
+    return result
+
+
+def optimise_cached(store, filename="HSNR.csv", solvername='cbc',
+                    number_timesteps=8760, parameters=None, presolve=False,
+                    time_limit=None, dtype=np.float64, duals=False,
+                    **kwargs):
+    """Return (result dict, key, cached) of a scenario, solved with
+    optimise_storage_size only if it is not in the store yet (or, with
+    duals, stored without them)."""
+    import HSNR
+
+    key, run, parameters = describe_run(filename, solvername,
+                                        number_timesteps, parameters,
+                                        presolve, time_limit, dtype)
+    if key in store:
+        result = store.get(key)
+        if not duals or 'price_mean' in result:
+            logging.info('Scenario {0} served from the result store'.format(
+                key))
+            return result, key, True
+
+    energysystem = HSNR.optimise_storage_size(
+        filename=filename, solvername=solvername,
+        number_timesteps=number_timesteps, parameters=parameters,
+        presolve=presolve, dtype=dtype, duals=duals,
+        cmdline_options=dict(kwargs.pop('cmdline_options', None) or {},
+                             **HSNR.solver_options(solvername,
+                                                   time_limit=time_limit)),
+        **kwargs)
+    result = store_energysystem(store, key, run, parameters, energysystem,
+                                duals=duals)
+    return result, key, False
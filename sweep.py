@@ -0,0 +1,118 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Scenario sweep over values.py-style parameter dictionaries.
+
+Every scenario (e.g. {'solar': 2, 'wind_offshore': 3}) overrides the
+defaults of values.py and is solved with optimise_storage_size and evaluated
+with get_result_dict in a worker of a process pool. Each worker runs the
+solver with a single thread (solver option and OMP_NUM_THREADS etc. of the
+solver process); numpy's BLAS in the worker is only limited if threadpoolctl
+is installed. The results are collected into one table with one row per
+scenario: the scenario parameters followed by the keys of get_result_dict
+(*_sum, *_inst, storage_cap, objective).
+
+Usage:
+
+    scenarios = grid(solar=[1, 2, 4], wind_offshore=[1, 2])
+    table = run_sweep(scenarios, processes=32)
+    table.to_csv('sweep.csv')
+
+"""
+
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # numpy keeps its default threads
+    threadpool_limits = None
+
+from scenarios import iter_scenarios
+
+
+# Environment variables limiting the threads of numerical libraries; set in
+# a worker they only reach the processes it starts (the solver), because the
+# BLAS of numpy was loaded before the fork
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'MKL_NUM_THREADS']
+
+
+def grid(**axes):
+    """Return the cartesian product of the given parameter values as list
+    of scenario dictionaries."""
+    names = list(axes)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*(axes[n] for n in names))]
+
+
+def _scalar(value):
+    """Reduce a result (float, 1-element Series/DataFrame) to a float."""
+    values = np.asarray(value, dtype=float)
+    return values.item() if values.size == 1 else values.sum()
+
+
+def _init_worker(threads):
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    # the thread pools already loaded in this process (numpy's BLAS)
+    if threadpool_limits is not None:
+        threadpool_limits(threads)
+
+
+def run_scenario(scenario, solvername='cbc', threads=1, time_limit=None,
+                 **kwargs):
+    """Solve one scenario and return its row of the result table."""
+    # imported here, so the worker processes load oemof themselves
+    import HSNR
+
+    row = dict(scenario)
+    try:
+        energysystem = HSNR.optimise_storage_size(
+            solvername=solvername, debug=False, tee_switch=False,
+            parameters=scenario,
+            cmdline_options=HSNR.solver_options(solvername, threads,
+                                                time_limit),
+            **kwargs)
+        result = HSNR.get_result_dict(energysystem)
+    except Exception as e:
+        logging.exception('Scenario {0} failed'.format(scenario))
+        row['error'] = repr(e)
+        return row
+    row.update((key, _scalar(value)) for key, value in result.items())
+    return row
+
+
+def run_sweep(scenarios, processes=None, solvername='cbc', threads=1,
+              time_limit=None, **kwargs):
+    """Solve all scenarios (list of dictionaries or scenario matrix, see
+    scenarios.py) in a process pool and return the result table.
+
+    Further keyword arguments (filename, number_timesteps, presolve, dtype,
+    ...) are passed to optimise_storage_size, e.g. dtype=np.float32 to halve
+    the memory of the time series per worker.
+    """
+    scenarios = list(iter_scenarios(scenarios))
+    processes = processes or os.cpu_count()
+    logging.info('Run {0} scenarios on {1} processes'.format(
+        len(scenarios), processes))
+
+    worker = functools.partial(run_scenario, solvername=solvername,
+                               threads=threads, time_limit=time_limit,
+                               **kwargs)
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(threads,)) as pool:
+        rows = pool.map(worker, scenarios, chunksize=1)
+
+    table = pd.DataFrame(rows)
+    table.index.name = 'scenario'
+    return table
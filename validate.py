@@ -0,0 +1,165 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Vectorized checks of the model input before the model is built and solved.
+
+Errors (the model would be infeasible or meaningless):
+
+ * fewer rows in the time series file than number_timesteps,
+ * gaps in the 'timestep' column,
+ * missing or infinite demand, negative demand or fixed feed-in,
+ * more residual demand (demand minus fixed feed-in) over the year than the
+   gas resource (summed_max) and the storage (at most the stored surplus
+   times its efficiency) can cover; for coupled regions (multiregion.py)
+   imports over the interconnectors count as well (check_balance).
+
+Warnings:
+
+ * missing values in fixed profiles (used as zero feed-in),
+ * hours in which the residual demand exceeds the output of pp_gas at the
+   maximum gas flow, so the storage has to cover the difference.
+
+Usage:
+
+    data = HSNR.load_data(fill_missing=None)
+    validate(data, number_timesteps=8760, parameters={'solar': 2})
+
+"""
+
+import logging
+
+import numpy as np
+
+
+class ValidationError(ValueError):
+    """Input data that cannot give a meaningful result; `problems` lists
+    all errors found."""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super(ValidationError, self).__init__(
+            'Invalid input data:\n  ' + '\n  '.join(problems))
+
+
+def gas_limits(parameters, number_timesteps):
+    """Return maximum hourly flow and annual energy of the gas resource
+    (rgas)."""
+    import HSNR
+    nominal_value = HSNR.RGAS_NOMINAL_VALUE * number_timesteps / 8760
+    return nominal_value, nominal_value * parameters['gas_summed_max']
+
+
+def check_data(data, number_timesteps=8760):
+    """Return the lists of errors and warnings of the time series alone and
+    its values (time steps x HSNR.DATA_COLUMNS, missing feed-in as zero) or
+    None if there are errors."""
+    import HSNR
+
+    errors, warnings = [], []
+
+    if len(data) < number_timesteps:
+        errors.append('{0} rows, {1} time steps needed.'.format(
+            len(data), number_timesteps))
+        number_timesteps = len(data)
+
+    if HSNR.TIMESTEP_COLUMN in data.columns:
+        steps = np.asarray(data[HSNR.TIMESTEP_COLUMN])[:number_timesteps]
+        gaps = np.flatnonzero(np.diff(steps) != 1)
+        if len(gaps):
+            errors.append('{0} gaps in timestep, first after {1}.'.format(
+                len(gaps), steps[gaps[0]]))
+
+    missing = [c for c in HSNR.DATA_COLUMNS if c not in data.columns]
+    if missing:
+        errors.append('Columns {0} missing.'.format(missing))
+        return errors, warnings, None
+
+    values = data[HSNR.DATA_COLUMNS].to_numpy(dtype=float)[:number_timesteps]
+    nan = np.isnan(values)
+    nan_count = nan.sum(axis=0)
+    negative = (values < 0).sum(axis=0)
+    infinite = np.isinf(values).sum(axis=0)
+    for number, column in enumerate(HSNR.DATA_COLUMNS):
+        if nan_count[number] and column == 'demand_el':
+            errors.append('demand_el: {0} missing values.'.format(
+                nan_count[number]))
+        elif nan_count[number]:
+            warnings.append('{0}: {1} missing values (no feed-in).'.format(
+                column, nan_count[number]))
+        if infinite[number]:
+            errors.append('{0}: {1} infinite values.'.format(
+                column, infinite[number]))
+        if negative[number]:
+            errors.append('{0}: {1} negative values.'.format(
+                column, negative[number]))
+    if errors:
+        return errors, warnings, None
+    return errors, warnings, np.where(nan, 0, values)
+
+
+def residual_demand(values, parameters):
+    """Hourly demand minus fixed feed-in [MW] of the values of
+    check_data."""
+    import HSNR
+
+    nominal_values = np.array([parameters['demand_scale']] +
+                              [-parameters[c] for c in HSNR.FIXED_SOURCES])
+    return values.dot(nominal_values)
+
+
+def check_balance(residual, parameters, imports=0.0):
+    """Return the lists of errors and warnings of the feasibility bounds of
+    one region: residual demand (see residual_demand) against gas, storage
+    and the maximum import power [MW] over interconnectors."""
+    import HSNR
+
+    errors, warnings = [], []
+    gas_flow, gas_energy = gas_limits(parameters, len(residual))
+
+    pp_gas_max = gas_flow * HSNR.PP_GAS_CONVERSION
+    peak_hours = np.flatnonzero(residual > pp_gas_max + imports)
+    if len(peak_hours):
+        warnings.append(
+            '{0} hours with residual demand above the pp_gas output at '
+            'maximum gas flow{1} (up to {2:.0f} MW from the storage).'.format(
+                len(peak_hours), ' and imports' if imports else '',
+                residual[peak_hours].max() - pp_gas_max - imports))
+
+    deficit = residual[residual > 0].sum()
+    surplus = -residual[residual < 0].sum()
+    coverable = (gas_energy * HSNR.PP_GAS_CONVERSION +
+                 surplus * HSNR.STORAGE_OUTFLOW_CONVERSION +
+                 imports * len(residual))
+    if deficit > coverable:
+        errors.append(
+            'Residual demand of {0:.4g} MWh exceeds the gas limit '
+            '(summed_max={1}){2} plus stored surplus: at most {3:.4g} '
+            'MWh.'.format(deficit, parameters['gas_summed_max'],
+                          ' and imports' if imports else '', coverable))
+    return errors, warnings
+
+
+def check(data, number_timesteps=8760, parameters=None):
+    """Return the lists of errors and warnings for the model input data
+    (missing values as NaN, see HSNR.load_data)."""
+    import HSNR
+
+    parameters = HSNR.get_parameters(parameters)
+    errors, warnings, values = check_data(data, number_timesteps)
+    if values is None:
+        return errors, warnings
+    errors, balance_warnings = check_balance(
+        residual_demand(values, parameters), parameters)
+    return errors, warnings + balance_warnings
+
+
+def validate(data, number_timesteps=8760, parameters=None):
+    """Log the warnings and raise a ValidationError if there are errors."""
+    errors, warnings = check(data, number_timesteps, parameters)
+    for warning in warnings:
+        logging.warning(warning)
+    if errors:
+        raise ValidationError(errors)
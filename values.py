@@ -21,22 +21,14 @@ solar=1
 waste=1
 wind_offshore=1
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+#################################################
+########    Parameter (Last, Gas, Kosten) #######
+#################################################
+demand_scale=0.25           # Skalierung des Lastprofils demand_el
+gas_summed_max=5.8          # Begrenzung der Gasresource (summed_max)
+storage_capex=1000
+storage_lifetime=20
+storage_wacc=0.05
+fixed_costs=20              # fixe Kosten der festen Quellen
+pp_gas_variable_costs=30
+storage_variable_costs=10e2
@@ -0,0 +1,236 @@
+## -*- coding: utf-8 -*-
+
+"""
+General description:
+---------------------
+
+Checkpointed, resumable scenario sweeps with a work queue on the file system.
+
+The queue is a directory (local or on a shared file system) with one JSON
+file per scenario that moves through the subdirectories
+
+    pending/  ->  running/  ->  done/
+
+A worker claims a scenario by renaming its file from pending/ to running/;
+the rename is atomic, so exactly one worker (of any machine) gets it. While
+the scenario is solved, a heartbeat thread touches the file in running/.
+The result row (like sweep.run_scenario, with 'error' if it failed) is
+written to done/ as soon as the run finishes. Claims of workers that died
+(no heartbeat for `stale` seconds, e.g. a preempted node) are moved back to
+pending/. Restarting the workers therefore solves only the unfinished
+scenarios, and no central service is needed.
+
+The run settings (time series file, solver, ...) are stored in
+settings.json of the queue, so all workers solve the same model. The
+heartbeat compares modification times with the local clock: `stale` must
+be well above the heartbeat interval plus the clock difference between the
+machines.
+
+Usage:
+
+    create('queue', sweep.grid(solar=[1, 2, 4]), solvername='cbc')
+    run_workers('queue', processes=32)     # on every machine
+    results('queue').to_csv('sweep.csv')
+
+"""
+
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+import pandas as pd
+
+from scenarios import iter_scenarios
+
+
+STATES = ['pending', 'running', 'done']
+SETTINGS_FILE = 'settings.json'
+# Settings of the run shared by all workers (see sweep.run_scenario)
+SETTINGS = {'filename': 'HSNR.csv', 'solvername': 'cbc',
+            'number_timesteps': 8760, 'presolve': False, 'time_limit': None,
+            'dtype': 'float64'}
+
+
+def _path(directory, state, name=''):
+    return os.path.join(directory, state, name)
+
+
+def _write_json(path, content):
+    """Write the file atomically: readers see the old or the new file."""
+    tmp = '{0}.{1}.{2}.tmp'.format(path, socket.gethostname(), os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(content, f, indent=1, default=float)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _names(directory, state):
+    return sorted((n for n in os.listdir(_path(directory, state))
+                   if n.endswith('.json')),
+                  key=lambda n: int(n[:-len('.json')]))
+
+
+def create(directory, scenarios, **settings):
+    """Create the queue (or add to it): scenario number i of scenarios
+    (dictionaries or scenario matrix, see scenarios.py) becomes pending
+    unless it is already queued, running or done. Further keyword arguments
+    override SETTINGS; they must not change once the queue exists."""
+    settings = dict(SETTINGS, **settings)
+    unknown = sorted(set(settings) - set(SETTINGS))
+    if unknown:
+        raise ValueError('Unknown settings {0}.'.format(unknown))
+    for state in STATES:
+        os.makedirs(_path(directory, state), exist_ok=True)
+
+    settings_file = os.path.join(directory, SETTINGS_FILE)
+    if os.path.exists(settings_file):
+        stored = _read_json(settings_file)
+        if stored != settings:
+            raise ValueError('Queue {0} was created with the settings '
+                             '{1}.'.format(directory, stored))
+    else:
+        _write_json(settings_file, settings)
+
+    existing = set()
+    for state in STATES:
+        existing.update(_names(directory, state))
+    added = 0
+    for number, scenario in enumerate(iter_scenarios(scenarios)):
+        name = '{0}.json'.format(number)
+        if name not in existing:
+            _write_json(_path(directory, 'pending', name), dict(scenario))
+            added += 1
+    logging.info('Queued {0} scenarios in {1}'.format(added, directory))
+    return added
+
+
+def status(directory):
+    """Number of scenarios per state."""
+    return {state: len(_names(directory, state)) for state in STATES}
+
+
+def recover(directory, stale=600):
+    """Move claims without heartbeat for `stale` seconds back to pending;
+    returns their number."""
+    recovered = 0
+    limit = time.time() - stale
+    for name in _names(directory, 'running'):
+        path = _path(directory, 'running', name)
+        try:
+            if os.path.getmtime(path) >= limit:
+                continue
+            os.rename(path, _path(directory, 'pending', name))
+        except FileNotFoundError:
+            # finished or recovered by another worker meanwhile
+            continue
+        logging.warning('Recovered stale scenario {0}'.format(name))
+        recovered += 1
+    return recovered
+
+
+def claim(directory):
+    """Claim the next pending scenario; returns (name, scenario) or None if
+    nothing is pending."""
+    for name in _names(directory, 'pending'):
+        pending = _path(directory, 'pending', name)
+        running = _path(directory, 'running', name)
+        try:
+            # rename keeps the modification time: refresh it first, so a
+            # fresh claim is never taken for a stale one
+            os.utime(pending)
+            os.rename(pending, running)
+        except FileNotFoundError:
+            # claimed by another worker
+            continue
+        if os.path.exists(_path(directory, 'done', name)):
+            # a recovered claim whose worker finished after all
+            os.remove(running)
+            continue
+        return name, _read_json(running)
+    return None
+
+
+def complete(directory, name, row):
+    """Store the result row of a claimed scenario and release the claim."""
+    _write_json(_path(directory, 'done', name), row)
+    try:
+        os.remove(_path(directory, 'running', name))
+    except FileNotFoundError:
+        pass
+
+
+def _heartbeat(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def run_worker(directory, threads=1, heartbeat=60, stale=600):
+    """Solve pending scenarios of the queue until none is left; returns
+    the number of solved scenarios."""
+    from sweep import run_scenario
+
+    settings = _read_json(os.path.join(directory, SETTINGS_FILE))
+    worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+    solved = 0
+    while True:
+        recover(directory, stale)
+        claimed = claim(directory)
+        if claimed is None:
+            break
+        name, scenario = claimed
+        logging.info('{0} solves scenario {1}'.format(worker, name))
+
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(
+            _path(directory, 'running', name), heartbeat, stop))
+        beat.daemon = True
+        beat.start()
+        try:
+            row = run_scenario(scenario, threads=threads, **settings)
+        finally:
+            stop.set()
+            beat.join()
+        row['worker'] = worker
+        complete(directory, name, row)
+        solved += 1
+    return solved
+
+
+def run_workers(directory, processes=None, threads=1, heartbeat=60,
+                stale=600):
+    """Run `processes` workers on this machine; returns the number of
+    scenarios they solved."""
+    from sweep import _init_worker
+
+    processes = processes or os.cpu_count()
+    worker = functools.partial(run_worker, threads=threads,
+                               heartbeat=heartbeat, stale=stale)
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(threads,)) as pool:
+        solved = sum(pool.map(worker, [directory] * processes))
+    logging.info('Solved {0} scenarios, queue {1}: {2}'.format(
+        solved, directory, status(directory)))
+    return solved
+
+
+def results(directory):
+    """Result table of the finished scenarios (index: scenario number), like
+    sweep.run_sweep."""
+    names = _names(directory, 'done')
+    table = pd.DataFrame([_read_json(_path(directory, 'done', name))
+                          for name in names],
+                         index=[int(name[:-len('.json')]) for name in names])
+    table.index.name = 'scenario'
+    return table